@@ -1,6 +1,12 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask
+import atexit
 import os
-from core.database import init_db
+from core.database import init_db, rebuild_indexes
+from core.persistence import open_from_env, get_persistence
+from core.password_pool import get_password_pool
 from extensions import scheduler
 from flask_cors import CORS
 
@@ -10,8 +16,33 @@ from modules.integration.auth_routes import bp as auth_bp
 from modules.scheduling.routes import bp as scheduling_bp 
 from modules.integration.library_routes import bp as library_bp 
 from modules.integration.data_sync_routes import bp as data_sync_bp
+from modules.integration.sync_jobs import get_sync_jobs
 from modules.integration.admin_routes import bp as admin_bp
 from modules.integration.info_routes import bp as info_bp
+from modules.reporting.routes import bp as reports_bp
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+def _load_db(app):
+    """Seed `db`, or restore it from the write-ahead log when DB_DATA_DIR is set."""
+    if get_persistence() is not None:
+        # Already restored and logging in this process: keep the live state
+        return
+    persistence = open_from_env()
+    if persistence is None:
+        init_db()
+        return
+
+    if persistence.recover():
+        rebuild_indexes()
+        app.config['DB_RECOVERY'] = persistence.recovery_stats
+        persistence.start()
+    else:
+        init_db()
+        persistence.start()
+        # Make the seed data durable as the first snapshot
+        persistence.snapshot()
+
 
 def create_app(init_scheduler=True):
     app = Flask(__name__)
@@ -20,11 +51,19 @@ def create_app(init_scheduler=True):
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret')
     app.config['SCHEDULER_API_ENABLED'] = True
     
-    init_db()
+    t0 = time.perf_counter()
+    # Start bcrypt worker processes in the background so the first login is not a cold start
+    get_password_pool().warm_up()
+    _load_db(app)
+    # Stop background sync jobs at exit; unregister first so repeated create_app() adds one hook
+    atexit.unregister(get_sync_jobs().shutdown)
+    atexit.register(get_sync_jobs().shutdown)
+    t1 = time.perf_counter()
     if init_scheduler:
         if not scheduler.running:
             scheduler.init_app(app)
             scheduler.start()
+    t2 = time.perf_counter()
             
     app.register_blueprint(auth_bp)
     app.register_blueprint(scheduling_bp)
@@ -32,9 +71,24 @@ def create_app(init_scheduler=True):
     app.register_blueprint(data_sync_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(info_bp)
+    app.register_blueprint(reports_bp)
+    t3 = time.perf_counter()
+
+    timings = {
+        'import_ms': round(_IMPORT_SECONDS * 1000, 1),
+        'seeding_ms': round((t1 - t0) * 1000, 1),
+        'scheduler_ms': round((t2 - t1) * 1000, 1),
+        'blueprints_ms': round((t3 - t2) * 1000, 1),
+    }
+    app.config['STARTUP_TIMINGS'] = timings
+    print("[Startup] " + ", ".join(f"{k}={v}" for k, v in timings.items()))
     
     return app
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
+    try:
+        app.run(debug=True, port=5000, use_reloader=False)
+    finally:
+        # Cancel running sync jobs while their thread pools still accept work
+        get_sync_jobs().shutdown()
\ No newline at end of file
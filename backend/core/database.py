@@ -3,16 +3,17 @@
 #
 # Implement HashMap-style in-memory DB (plain dicts) and helpers used by routes.
 # """
-from typing import Optional
-from datetime import datetime
+from typing import List, Optional, Tuple
 from dataclasses import asdict
-from core.models import User, Appointment, Document, DocumentAccess
-import bcrypt
+from core.models import User, AppointmentRecord
+from core.password_pool import hash_password, verify_password
+import json
+import os
 
 # Global HashMap (in-memory)
 db = {
     "users": {},         # user_id -> {id,name,email,password,role}
-    "appointments": {},  # appt_id -> {id,tutor_id,student_id,time}
+    "appointments": {},  # appt_id -> AppointmentRecord (serialize with .to_dict())
     "documents": {},     # doc_id -> Document
     "access_logs": {},   # Xem lịch sử truy cập
     "free_schedules": {},
@@ -27,225 +28,126 @@ db = {
     }
 }
 
+# Secondary index: normalized email -> user_id (kept in sync by the helpers below)
+_email_index = {}
 
-def init_db():
-    """Initialize sample data."""
-    def _hash(pw: str) -> str:
-        return bcrypt.hashpw(pw.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-    u1 = User(id="u1", name="Đỗ Hồng Phúc", email="tutor@hcmut.edu.vn", password=_hash("123"), role="TUTOR")
-    u2 = User(id="u2", name="Duy Khang", email="student@hcmut.edu.vn", password=_hash("456"), role="STUDENT")
-    u3 = User(id="u3", name="Tín", email="admin@hcmut.edu.vn", password=_hash("admin"), role="ADMIN")
+def _normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
 
-    u4 = User(id="u4", name="Mai Đức Trung", email="mai.trung@hcmut.edu.vn", password=_hash("123"), role="OFFICER")
-    u5 = User(id="u5", name="Quản Thành Thơ", email="thothanhquan@hcmut.edu.vn", password=_hash("123"), role="DEPARTMENT")
-    u6 = User(id="u6", name="Trần Ngọc Bảo Duy", email="duy.bao@hcmut.edu.vn", password=_hash("123"), role="UNIVERSITY_OFFICER")
-    
 
-    db["users"] = {
-        u1.id: asdict(u1),
-        u2.id: asdict(u2),
-        u3.id: asdict(u3),
-        u4.id: asdict(u4),
-        u5.id: asdict(u5),
-        u6.id: asdict(u6),
-    }
+def rebuild_email_index() -> None:
+    """Recompute `_email_index` from `db["users"]` (after seeding/bulk loads)."""
+    _email_index.clear()
+    for uid, user in db["users"].items():
+        key = _normalize_email(user.get("email"))
+        if key:
+            _email_index.setdefault(key, uid)
 
-    # Seed academic fields for students
-    db["users"][u2.id]["score"] = 7.5
-    db["users"][u2.id]["conduct_points"] = 8.0
-    db["users"][u2.id]["scholarship_level"] = "NONE"
-    # Mark sample student as booked for seeded appointments
-    db["users"][u2.id]["booked_appointments"] = ["a1", "a2"]
-
-    u_nva = User(
-        id="u_nva", 
-        name="Nguyễn Ngọc Tôn", 
-        email="ton.nguyen1411030723@hcmut.edu.vn", 
-        password=_hash("123"), 
-        role="TUTOR"
-    )
-    db["users"][u_nva.id] = asdict(u_nva)
-
-    # --- SỬA ĐOẠN NÀY ---
-    # Cập nhật theo model mới: dùng start_time/end_time thay vì time, bỏ student_id
-    a1 = Appointment(
-        id="a1", 
-        tutor_id="u1",  # <--- Sửa ID cho đúng ông Nguyễn Văn A
-        name="Luyện thi Đại số tuyến tính",
-        start_time="2025-11-26 09:00:00",
-        end_time="2025-11-26 11:00:00",
-        place="H6-304",
-        max_slot=5,
-        current_slots=["u2"],
-        status="OPEN",
-        report={
-            "present": 5,
-            "capacity": 5,
-            "room": "H6-304",
-            "notes": "Buổi luyện thi, sĩ số đầy đủ"
-        }
-    )
-    # Lưu a1 vào DB (Dùng key id để không bị ghi đè)
-    db["appointments"][a1.id] = asdict(a1) 
-
-    # --- TẠO BUỔI 2 ---
-    a2 = Appointment(
-        id="a2", 
-        tutor_id="u1", # <--- Sửa ID cho đúng
-        name="Luyện thi Đại số tuyến tính (Buổi 2)",
-        start_time="2025-12-06 14:00:00",
-        end_time="2025-12-06 16:00:00",
-        place="H6-304",
-        max_slot=5,
-        current_slots=["u2"],
-        status="OPEN",
-        report={
-            "present": 4,
-            "capacity": 5,
-            "room": "H6-304",
-            "notes": "Vắng 1 sinh viên"
-        }
-    )
-    # Lưu a2 vào DB
-    db["appointments"][a2.id] = asdict(a2)
-
-    a_nva = Appointment(
-        id="apt_nva_1", 
-        tutor_id="u_nva", 
-        name="Họp nghiên cứu Khoa học",
-        start_time="2025-12-05 14:00:00",
-        end_time="2025-12-05 16:00:00",
-        place="Phòng H6-301",
-        max_slot=10,
-        current_slots=[],
-        status="OPEN",
-        report={
-            "present": 8,
-            "capacity": 10,
-            "room": "H6-301",
-            "notes": "Buổi họp nghiên cứu, thảo luận dự án"
-        }
-    )
-    db["appointments"][a_nva.id] = asdict(a_nva)
-
-    a_nvb = Appointment(
-        id="apt_nva_2", 
-        tutor_id="u_nva", 
-        name="Công nghệ phần mềm",
-        start_time="2025-12-06 14:00:00",
-        end_time="2025-12-06 16:00:00",
-        place="Phòng H6-301",
-        max_slot=90,
-        current_slots=[],
-        status="OPEN",
-        report={
-            "present": 60,
-            "capacity": 90,
-            "room": "H6-301",
-            "notes": "Buổi học quy mô lớn"
-        }
-    )
-    db["appointments"][a_nvb.id] = asdict(a_nvb)
-
-    # --------------------
-    # --- TÍN THÊM DỮ LIỆU MẪU CHO MODULE 3 - DOCUMENTS ---
-    # --- 3. DOCUMENTS (Sinh tự động 40+ tài liệu) ---
-
-    mock_courses = [
-        ("CH1003", "Hóa đại cương"),
-        ("SP1037", "Tư tưởng Hồ Chí Minh"),
-        ("CO2001", "Kỹ năng Chuyên nghiệp cho Kỹ sư"),
-        ("CO3001", "Công nghệ Phần mềm"),
-        ("CO3005", "Nguyên lý Ngôn ngữ Lập trình"),
-        ("CO3093", "Mạng máy tính"),
-        ("CO3011", "Quản lý Dự án Phần mềm"),
-        ("CO3013", "Xây dựng Chương trình Dịch"),
-        ("CO3015", "Kiểm tra Phần mềm"),
-        ("CO3017", "Kiến trúc Phần mềm"),
-        ("CO3021", "Hệ Quản trị Cơ sở Dữ Liệu"),
-        ("CO3023", "CSDL Phân tán và Hướng đối tượng"),
-        ("CO3027", "Thương mại Điện tử"),
-        ("CO3029", "Khai phá Dữ liệu"),
-        ("CO3031", "Phân tích và Thiết kế Giải Thuật"),
-        ("CO3033", "Bảo mật Hệ thống Thông tin"),
-        ("CO3035", "Hệ thời gian thực"),
-        ("CO3037", "Phát triển Ứng dụng IoT"),
-        ("CO3041", "Hệ thống Thông minh"),
-        ("CO3043", "Phát triển Ứng dụng Di động"),
-        ("CO3045", "Lập trình Game"),
-        ("CO3047", "Mạng máy tính nâng cao"),
-        ("CO3049", "Lập trình Web"),
-        ("CO3051", "Hệ thống thiết bị di động"),
-        ("CO3057", "Xử lý Ảnh số và Thị giác Máy tính"),
-        ("CO3059", "Đồ họa Máy tính"),
-        ("CO3061", "Nhập môn Trí tuệ Nhân tạo"),
-        ("CO3065", "Công nghệ Phần mềm Nâng cao"),
-        ("CO3067", "Tính toán Song song"),
-        ("CO3069", "Mật mã và An ninh mạng"),
-        ("CO3071", "Hệ phân bố"),
-        ("CO3083", "Mật mã học và Mã hóa Thông tin"),
-        ("CO3085", "Xử lý Ngôn ngữ Tự nhiên"),
-        ("CO3089", "Chủ đề Nâng cao KHMT"),
-        ("CO3101", "Đồ án Tổng hợp - AI"),
-        ("CO3103", "Đồ án Tổng hợp - CNPM"),
-        ("CO3105", "Đồ án Tổng hợp - HTTT"),
-        ("CO3109", "Thực tập Đồ án Đa ngành - CNPM"),
-        ("CO4031", "Kho dữ Liệu và Hỗ trợ Quyết định"),
-        ("CO4033", "Phân tích Dữ liệu lớn"),
-        ("TH3636", "Đặc sản Nem chua")  # Giữ lại môn cũ của bạn
-    ]
-
-    d1 = Document(
-        id="doc1",
-        title="Slide bài giảng CNPM Chương 1",
-        description="Tổng quan về quy trình phần mềm",
-        uploader_id="u1",
-        link="https://drive.google.com/file/d/xyz...",
-        course_code="CO3001",
-        created_at="2025-11-26 10:00:00"
-    )
-    db["documents"][d1.id] = asdict(d1)
-
-    d2 = Document(
-        id="doc2",
-        title="Giới thiệu đặc sản nem chua",
-        description="Tổng quan mảnh đất trữ tình",
-        uploader_id="u3",
-        link="https://drive.google.com/file/d/366...",
-        course_code="TH3636",
-        created_at="2025-11-26 10:00:00"
-    )
-    db["documents"][d2.id] = asdict(d2)
-
-    # Vòng lặp sinh thêm 40 tài liệu từ danh sách trên
-    for i, (code, name) in enumerate(mock_courses, start=3):
-        doc_id = f"doc{i}"
-        # Xen kẽ người upload để đa dạng dữ liệu
-        uploader = "u1" if i % 2 == 0 else "u3"
-
-        new_doc = Document(
-            id=doc_id,
-            title=f"Tài liệu ôn tập {name}",
-            description=f"Tổng hợp kiến thức, đề thi các năm môn {name} - HK232.",
-            uploader_id=uploader,
-            link=f"https://drive.google.com/file/d/mock_link_{doc_id}",
-            course_code=code,
-            created_at="2025-11-26 10:00:00"
-        )
-        db["documents"][doc_id] = asdict(new_doc)
-
-
-
-    # log1 = DocumentAccess(
-    #     id="log1",
-    #     user_id="u1",
-    #     doc_id="doc1",
-    #     action="VIEW", 
-    #     timestamp="2025-11-26 10:05:00"
-    # )
-    # db["access_logs"][log1.id] = asdict(log1)
-    # --------------------
+
+# Callbacks that rebuild derived in-memory indexes after `db` is (re)loaded
+_rebuild_hooks = []
+
+
+def register_rebuild_hook(fn):
+    """Register `fn()` to be called by `rebuild_indexes()`; usable as a decorator."""
+    _rebuild_hooks.append(fn)
+    return fn
+
+
+def rebuild_indexes() -> None:
+    """Recompute every derived index from the current contents of `db`."""
+    rebuild_email_index()
+    for fn in _rebuild_hooks:
+        fn()
+
+
+# Callbacks notified of every record-level mutation (e.g. the write-ahead log)
+_change_listeners = []
+
+
+def register_change_listener(fn):
+    """Register `fn(table, key, value)`; `value` is None when the record was deleted."""
+    _change_listeners.append(fn)
+    return fn
+
+
+def unregister_change_listener(fn) -> None:
+    if fn in _change_listeners:
+        _change_listeners.remove(fn)
+
+
+def mark_dirty(table: str, key: str) -> None:
+    """Report that `db[table][key]` was created, changed or deleted.
+
+    Call this after every mutation of a `db` record so listeners such as the
+    write-ahead log see it. A no-op when nothing is listening.
+    """
+    if not _change_listeners:
+        return
+    value = db.get(table, {}).get(key)
+    for fn in _change_listeners:
+        fn(table, key, value)
+
+
+def update_user_email(user_id: str, email: str) -> None:
+    """Change a user's email and keep the email index consistent.
+
+    Raises ValueError if another user already owns the (normalized) email.
+    """
+    user = db["users"][user_id]
+    new_key = _normalize_email(email)
+    owner = _email_index.get(new_key)
+    if owner is not None and owner != user_id and owner in db["users"]:
+        raise ValueError("Email already exists")
+
+    old_key = _normalize_email(user.get("email"))
+    if _email_index.get(old_key) == user_id:
+        del _email_index[old_key]
+    user["email"] = email
+    if new_key:
+        _email_index[new_key] = user_id
+    mark_dirty("users", user_id)
+
+
+SEED_FIXTURE_VERSION = 1
+SEED_FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", f"seed_v{SEED_FIXTURE_VERSION}.json")
+
+
+def load_seed_fixture(path: Optional[str] = None) -> dict:
+    """Read the versioned seed fixture (users with precomputed bcrypt hashes,
+    appointments, documents). Raises ValueError on a version mismatch."""
+    path = path or os.environ.get("SEED_FIXTURE") or SEED_FIXTURE_PATH
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != SEED_FIXTURE_VERSION:
+        raise ValueError(f"Seed fixture {path} has version {data.get('version')}, "
+                         f"expected {SEED_FIXTURE_VERSION}")
+    return data
+
+
+def init_db(mode: Optional[str] = None):
+    """Initialize sample data.
+
+    `mode` (default: env `SEED_MODE`, else "fixture"):
+      - "fixture": load users/appointments/documents from the seed fixture.
+        Password hashes are stored precomputed, so no bcrypt work at boot.
+      - "none": start with empty tables (e.g. before restoring real data).
+    """
+    mode = mode or os.environ.get("SEED_MODE", "fixture")
+    if mode == "none":
+        db["users"] = {}
+        db["appointments"] = {}
+        db["documents"] = {}
+    elif mode == "fixture":
+        data = load_seed_fixture()
+        db["users"] = {u["id"]: u for u in data["users"]}
+        db["appointments"] = {a["id"]: AppointmentRecord.from_dict(a) for a in data["appointments"]}
+        db["documents"] = {d["id"]: d for d in data["documents"]}
+    else:
+        raise ValueError(f"Unknown SEED_MODE: {mode}")
+
+    rebuild_indexes()
 
 
 def _next_user_id() -> str:
@@ -274,32 +176,76 @@ def create_user(name: str, email: str, password: str, role: str = "PENDING", id:
     else:
         uid = _next_user_id()
 
-    # hash password before storing
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    # hash password before storing (on the bounded worker pool; may raise PasswordPoolBusy)
+    hashed = hash_password(password)
     user_obj = User(id=uid, name=name, email=email, password=hashed, role=role)
     user = asdict(user_obj)
     db["users"][uid] = user
+    key = _normalize_email(email)
+    if key:
+        _email_index[key] = uid
+    mark_dirty("users", uid)
     return user
 
 
+def bulk_create_users(records: List[dict], role: str = "PENDING") -> Tuple[List[dict], List[Tuple[str, str]]]:
+    """Insert many SSO-only users at once (no local password: they sign in through SSO).
+
+    Each record needs `id`, `name` and `email`; other profile keys (role,
+    major, faculty, ...) are copied as is. Ids and emails are checked against
+    existing users and within the batch in one pass, with no bcrypt work and
+    no id probing. Returns (created users, [(id, reason), ...] for skipped records).
+    """
+    created, rejected = [], []
+    batch_emails = set()
+    template = asdict(User(id="", name="", email="", password=None, role=role))
+    for rec in records:
+        uid = rec.get("id")
+        key = _normalize_email(rec.get("email"))
+        if not uid or not key:
+            rejected.append((uid, "Thiếu id hoặc email"))
+            continue
+        if uid in db["users"]:
+            rejected.append((uid, "User id already exists"))
+            continue
+        if key in batch_emails or get_user_by_email(key) is not None:
+            rejected.append((uid, "Email already exists"))
+            continue
+        batch_emails.add(key)
+        user = dict(template, booked_appointments=[])
+        user.update((k, v) for k, v in rec.items() if k != "password")
+        created.append(user)
+
+    for user in created:
+        db["users"][user["id"]] = user
+        _email_index[_normalize_email(user["email"])] = user["id"]
+        mark_dirty("users", user["id"])
+    return created, rejected
+
+
 def get_user_by_email(email: str) -> Optional[dict]:
-    for user in db["users"].values():
-        if user.get("email") == email:
-            return user
-    return None
+    """O(1) lookup through the case-normalized email index."""
+    uid = _email_index.get(_normalize_email(email))
+    if uid is None:
+        return None
+    user = db["users"].get(uid)
+    # Guard against a stale entry (user removed or email edited in place)
+    if user is None or _normalize_email(user.get("email")) != _normalize_email(email):
+        return None
+    return user
 
 
 def authenticate(email: str, password: str) -> Optional[str]:
-    """Return user_id if credentials match, else None."""
+    """Return user_id if credentials match, else None.
+
+    The bcrypt check runs on the password pool and may raise PasswordPoolBusy.
+    """
     u = get_user_by_email(email)
     if not u:
         return None
     stored = u.get("password")
-    try:
-        if stored and bcrypt.checkpw(password.encode('utf-8'), stored.encode('utf-8')):
-            return u.get("id")
-    except ValueError:
-        return None
+    if stored and verify_password(password, stored):
+        return u.get("id")
     return None
 
 
@@ -307,6 +253,7 @@ def set_user_role(user_id: str, role: str) -> bool:
     if user_id not in db["users"]:
         return False
     db["users"][user_id]["role"] = role
+    mark_dirty("users", user_id)
     return True
 
 
@@ -2,13 +2,17 @@
 from dataclasses import dataclass, asdict, field
 from typing import Optional, List, Set
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
+import sys
 
 # SyncService
 
 class SyncStatusEnum(Enum):
     SUCCESS = "SUCCESS"
+    PARTIAL = "PARTIAL"   # Một số chunk lỗi; lần chạy sau tiếp tục từ checkpoint
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
 
 class SyncTypeEnum(Enum):
     PERSONAL = "PERSONAL"
@@ -36,13 +40,29 @@ class SyncReport:
     message: str
     records_processed: int = 0
     errors: List[str] = field(default_factory=list)
+    # Delta sync: how the processed records were applied
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # Thời gian chạy: `timestamp` là lúc bắt đầu, `phases` là ms theo từng pha
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    records_per_second: Optional[float] = None
+    phases: dict = field(default_factory=dict)
     
     def to_dict(self):
         return {
             "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
             "status": self.status.value,
             "message": self.message,
             "records_processed": self.records_processed,
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duration_ms": self.duration_ms,
+            "records_per_second": self.records_per_second,
+            "phases": self.phases,
             "errors": self.errors
         }
 
@@ -141,6 +161,144 @@ class Appointment:
     def to_dict(self) -> dict:
         return asdict(self)
 
+# Compact in-memory appointment store
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+_EPOCH = datetime(1970, 1, 1)
+
+STATUS_OPEN = sys.intern("OPEN")
+STATUS_CANCELLED = sys.intern("CANCELLED")
+
+
+def epoch_seconds(dt: datetime) -> int:
+    """Naive datetime -> integer seconds since 1970-01-01 (no timezone shift)."""
+    return int((dt - _EPOCH).total_seconds())
+
+
+def parse_epoch(time_str: str) -> int:
+    return epoch_seconds(datetime.strptime(time_str, TIME_FORMAT))
+
+
+@lru_cache(maxsize=4096)
+def format_epoch(ts: int) -> str:
+    # Sessions start on a handful of distinct times, so the cache hit rate is high
+    return (_EPOCH + timedelta(seconds=ts)).strftime(TIME_FORMAT)
+
+
+class AppointmentRecord:
+    """Internal storage form of an `Appointment` kept in `db["appointments"]`.
+
+    Times are epoch seconds, the roster is an insertion-ordered dict used as a
+    set and the status string is interned. `to_dict()` produces the public
+    JSON shape (same keys as `asdict(Appointment(...))`) and should only be
+    called at the API edge.
+    """
+    __slots__ = ("id", "tutor_id", "name", "start", "end", "place", "max_slot",
+                 "status", "roster", "feedback", "report", "extra")
+
+    def __init__(self, id: str, tutor_id: str, name: str, start: int, end: int, place: str,
+                 max_slot: int, status: str = STATUS_OPEN, roster=(), feedback=None,
+                 report: Optional[dict] = None, extra: Optional[dict] = None):
+        self.id = id
+        self.tutor_id = tutor_id
+        self.name = name
+        self.start = start
+        self.end = end
+        self.place = place
+        self.max_slot = max_slot
+        self.status = sys.intern(status)
+        self.roster = dict.fromkeys(roster)
+        self.feedback = list(feedback) if feedback else None
+        self.report = report
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AppointmentRecord":
+        known = {"id", "tutor_id", "name", "start_time", "end_time", "place", "max_slot",
+                 "status", "current_slots", "feedback", "report"}
+        return cls(
+            id=data["id"],
+            tutor_id=data["tutor_id"],
+            name=data.get("name", "Buổi học"),
+            start=parse_epoch(data["start_time"]),
+            end=parse_epoch(data["end_time"]),
+            place=data.get("place", "Online"),
+            max_slot=int(data.get("max_slot", 1)),
+            status=data.get("status", STATUS_OPEN),
+            roster=data.get("current_slots") or (),
+            feedback=data.get("feedback"),
+            report=data.get("report"),
+            extra={k: v for k, v in data.items() if k not in known},
+        )
+
+    @classmethod
+    def from_model(cls, apt: "Appointment") -> "AppointmentRecord":
+        return cls.from_dict(asdict(apt))
+
+    @property
+    def start_time(self) -> str:
+        return format_epoch(self.start)
+
+    @property
+    def end_time(self) -> str:
+        return format_epoch(self.end)
+
+    @property
+    def current_slots(self) -> List[str]:
+        return list(self.roster)
+
+    def add_feedback(self, entry: dict) -> int:
+        """Append `entry`; returns its position in `feedback`."""
+        if self.feedback is None:
+            self.feedback = []
+        self.feedback.append(entry)
+        return len(self.feedback) - 1
+
+    def set_extra(self, key: str, value) -> None:
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def to_dict(self, fields: Optional[List[str]] = None) -> dict:
+        """Public JSON shape; with `fields`, build only those keys."""
+        if fields is not None:
+            return {k: self._field(k) for k in fields if self._has_field(k)}
+        data = {
+            "id": self.id,
+            "tutor_id": self.tutor_id,
+            "name": self.name,
+            "start_time": format_epoch(self.start),
+            "end_time": format_epoch(self.end),
+            "place": self.place,
+            "max_slot": self.max_slot,
+            "status": self.status,
+            "current_slots": list(self.roster),
+            "feedback": list(self.feedback) if self.feedback else [],
+            "report": self.report,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    _PUBLIC_FIELDS = ("id", "tutor_id", "name", "start_time", "end_time", "place", "max_slot",
+                      "status", "current_slots", "feedback", "report")
+
+    def _has_field(self, key: str) -> bool:
+        return key in self._PUBLIC_FIELDS or bool(self.extra and key in self.extra)
+
+    def _field(self, key: str):
+        if key == "start_time":
+            return format_epoch(self.start)
+        if key == "end_time":
+            return format_epoch(self.end)
+        if key == "current_slots":
+            return list(self.roster)
+        if key == "feedback":
+            return list(self.feedback) if self.feedback else []
+        if key in self._PUBLIC_FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+
 @dataclass
 class Document:
     id: str
@@ -181,6 +339,8 @@ class SchedulerConfig:
     is_active: bool = False
     last_run: Optional[str] = None
     next_run: Optional[str] = None
+    # Thời gian chạy (ms) của lần sync tự động gần nhất
+    last_duration_ms: Optional[float] = None
 
     def to_dict(self):
         return asdict(self)
\ No newline at end of file
@@ -0,0 +1,201 @@
+# core/pagination.py
+"""Cursor pagination, server-side sorting and field projection for listings.
+
+Query parameters understood by `paginate_table`:
+    limit   page size (1..MAX_LIMIT); without `limit`/`cursor` everything is returned
+    cursor  opaque value from the previous page's `next_cursor`
+    sort    one of the endpoint's sort keys, prefix with '-' for descending
+    fields  comma-separated projection, e.g. `fields=id,name,role`
+
+The ordering of a table by a sort key is built once and then kept up to
+date record by record from `mark_dirty` (a bisect removal and insertion per
+change), and the cursor carries the last (sort value, id) pair rather than an
+offset. A page is therefore a bisect plus `limit` records, even under steady
+writes, and concurrent inserts do not shift or repeat items.
+"""
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.database import db, register_change_listener, register_rebuild_hook
+
+MAX_LIMIT = 500
+
+class _SortedView:
+    """Rows of one table ordered by one sort key, as (sort value, id) entries."""
+
+    def __init__(self, getter: Callable, entries: List[tuple]):
+        self.getter = getter
+        self.entries = entries
+        self.by_id = {entry[1]: entry for entry in entries}
+
+    def update(self, item_id, rec) -> None:
+        old = self.by_id.pop(item_id, None)
+        if old is not None:
+            pos = bisect_left(self.entries, old)
+            if pos < len(self.entries) and self.entries[pos] == old:
+                del self.entries[pos]
+        if rec is not None:
+            entry = (_sort_value(self.getter(rec)), item_id)
+            insort(self.entries, entry)
+            self.by_id[item_id] = entry
+
+
+_views: Dict[Tuple[str, str], _SortedView] = {}
+_lock = threading.Lock()
+
+
+class PageError(ValueError):
+    """Bad pagination parameters (maps to HTTP 400)."""
+
+
+@register_change_listener
+def _on_db_change(table, key, value):
+    with _lock:
+        for (view_table, _), view in _views.items():
+            if view_table == table:
+                view.update(key, value)
+
+
+@register_rebuild_hook
+def _on_db_reload():
+    with _lock:
+        _views.clear()
+
+
+def _sort_value(value):
+    # Mixed/None values must still compare: None < numbers < strings < others
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, str(value))
+
+
+def _encode_cursor(entry: tuple) -> str:
+    raw = json.dumps([list(entry[0]), entry[1]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        value, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (tuple(value), item_id)
+    except Exception:
+        raise PageError('cursor không hợp lệ')
+
+
+def encode_key(key: tuple) -> str:
+    """Opaque cursor for an index position given as a tuple of JSON values."""
+    raw = json.dumps(list(key), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_key(cursor: str, types: tuple) -> tuple:
+    """Inverse of `encode_key`; `types` gives the expected type of each item. Raises PageError."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise PageError('cursor không hợp lệ')
+    if (not isinstance(key, list) or len(key) != len(types)
+            or not all(isinstance(v, t) for v, t in zip(key, types))):
+        raise PageError('cursor không hợp lệ')
+    return tuple(key)
+
+
+def _sorted_view(table: str, sort: str, getter: Callable) -> _SortedView:
+    """The cached view; call with `_lock` held.
+
+    Built under the lock so that a write landing mid-build is applied by
+    `_on_db_change` right after, never lost.
+    """
+    view = _views.get((table, sort))
+    if view is not None:
+        return view
+    rows = db.get(table, {})
+    for _ in range(5):
+        try:
+            entries = sorted((_sort_value(getter(rec)), item_id) for item_id, rec in rows.items())
+            break
+        except RuntimeError:
+            # Table resized by a concurrent write while sorting; try again
+            continue
+    else:
+        raise PageError('Dữ liệu đang thay đổi, vui lòng thử lại')
+    view = _views[(table, sort)] = _SortedView(getter, entries)
+    return view
+
+
+def parse_fields(args) -> Optional[List[str]]:
+    raw = args.get('fields')
+    if not raw:
+        return None
+    return [f.strip() for f in raw.split(',') if f.strip()]
+
+
+def paginate_table(table: str, args, sort_keys: Dict[str, Callable],
+                   render: Callable[[object, Optional[List[str]]], dict],
+                   default_sort: str = 'id') -> dict:
+    """Return {'items', 'total', 'next_cursor'} for `db[table]`.
+
+    `sort_keys` maps sort names to getters on a stored record; `render`
+    turns a record into its public dict, restricted to `fields` when given.
+    Raises PageError on bad parameters.
+    """
+    fields = parse_fields(args)
+    sort = args.get('sort')
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+
+    rows = db.get(table, {})
+    if sort is None and limit is None and cursor is None:
+        # Legacy behaviour: whole table in insertion order
+        items = [render(rec, fields) for rec in list(rows.values())]
+        return {'items': items, 'total': len(items), 'next_cursor': None}
+
+    sort = sort or default_sort
+    descending = sort.startswith('-')
+    sort_name = sort.lstrip('-')
+    if sort_name not in sort_keys:
+        raise PageError(f'sort phải là một trong: {", ".join(sorted(sort_keys))}')
+
+    if limit is None:
+        limit = MAX_LIMIT
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise PageError('limit phải là số nguyên')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise PageError(f'limit phải trong khoảng 1..{MAX_LIMIT}')
+
+    after = _decode_cursor(cursor) if cursor else None
+    with _lock:
+        view = _sorted_view(table, sort_name, sort_keys[sort_name]).entries
+        total = len(view)
+        if descending:
+            end = bisect_left(view, after) if after else total
+            start = max(end - limit, 0)
+            entries = view[start:end][::-1]
+            has_more = start > 0
+        else:
+            start = bisect_right(view, after) if after else 0
+            entries = view[start:start + limit]
+            has_more = start + limit < total
+
+    items = []
+    for entry in entries:
+        rec = rows.get(entry[1])
+        if rec is not None:
+            items.append(render(rec, fields))
+    next_cursor = _encode_cursor(entries[-1]) if entries and has_more else None
+    return {'items': items, 'total': total, 'next_cursor': next_cursor}
+
+
+def project(data: dict, fields: Optional[List[str]]) -> dict:
+    if not fields:
+        return data
+    return {k: data[k] for k in fields if k in data}
@@ -0,0 +1,191 @@
+# core/password_pool.py
+"""Bounded process pool for bcrypt hashing and verification.
+
+bcrypt is deliberately CPU-heavy; running it inline ties up a Flask worker
+thread per login/registration. Calls here are shipped to a small process
+pool instead. At most `max_pending` calls may be queued or running: beyond
+that `PasswordPoolBusy` is raised immediately so the route can answer 503
+with Retry-After rather than pile requests up behind the hashing backlog.
+"""
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+
+import bcrypt
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the pool's queue limit is reached."""
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Hệ thống đang bận xử lý đăng nhập, vui lòng thử lại sau")
+        self.retry_after = retry_after
+
+
+# Module-level so they can be pickled into worker processes
+def _in_worker_process() -> bool:
+    """True inside a spawned child, where a pool must not be started.
+
+    `parent_process()` is only set once the child has finished bootstrapping.
+    Before that the child re-imports the parent's main script as
+    `__mp_main__` (which is when a script calling `create_app` at import time
+    reaches `warm_up`); in the parent that name is just an alias of `__main__`.
+    """
+    if multiprocessing.parent_process() is not None:
+        return True
+    mp_main = sys.modules.get("__mp_main__")
+    return mp_main is not None and mp_main is not sys.modules.get("__main__")
+
+
+def _warm() -> bool:
+    return True
+
+
+def _hashpw(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def _checkpw(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+class PasswordPool:
+    def __init__(self, workers: int = 2, max_pending: int = 16, timeout: float = 10.0, retry_after: int = 1):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._latencies = deque(maxlen=512)  # seconds, most recent calls
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordPoolBusy(self.retry_after)
+
+        started = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            future = self._get_executor().submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                # Backlog too deep to answer in time: same 503 + Retry-After as a full queue
+                future.cancel()
+                with self._lock:
+                    self._timeouts += 1
+                raise PasswordPoolBusy(self.retry_after)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+                self._latencies.append(time.perf_counter() - started)
+            self._slots.release()
+
+    def warm_up(self) -> None:
+        """Start the worker processes now instead of on the first login.
+
+        Spawning workers (and importing bcrypt in each) takes seconds; the
+        no-op tasks are not waited on, so app startup is not delayed.
+        """
+        if self.workers <= 0 or _in_worker_process():
+            return
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_warm)
+
+    def hash_password(self, password: str) -> str:
+        return self._run(_hashpw, password)
+
+    def verify_password(self, password: str, hashed: str) -> bool:
+        return self._run(_checkpw, password, hashed)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latencies)
+            pending = self._pending
+            data = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": pending,
+                "peak_queue_depth": self._peak_pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+            }
+        if lat:
+            data["hash_latency_ms"] = {
+                "avg": round(sum(lat) / len(lat) * 1000, 1),
+                "p50": round(lat[len(lat) // 2] * 1000, 1),
+                "p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 1),
+                "samples": len(lat),
+            }
+        return data
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[PasswordPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_password_pool() -> PasswordPool:
+    """Process-wide pool configured from the environment.
+
+    PASSWORD_POOL_WORKERS (default: min(4, CPUs); 0 = run inline),
+    PASSWORD_POOL_MAX_PENDING (default: 8 per worker),
+    PASSWORD_POOL_TIMEOUT_S (10), PASSWORD_POOL_RETRY_AFTER_S (1).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.environ.get("PASSWORD_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+            _pool = PasswordPool(
+                workers=workers,
+                max_pending=int(os.environ.get("PASSWORD_POOL_MAX_PENDING", max(workers, 1) * 8)),
+                timeout=float(os.environ.get("PASSWORD_POOL_TIMEOUT_S", "10")),
+                retry_after=int(os.environ.get("PASSWORD_POOL_RETRY_AFTER_S", "1")),
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def hash_password(password: str) -> str:
+    return get_password_pool().hash_password(password)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return get_password_pool().verify_password(password, hashed)
@@ -0,0 +1,317 @@
+# core/persistence.py
+"""Opt-in durability for the in-memory `db`: write-ahead log + snapshots.
+
+Disabled unless `DB_DATA_DIR` is set. When enabled, every `mark_dirty(table,
+key)` call from the business code appends the record's full new value (or a
+delete) to an append-only log. A flusher thread fsyncs the log in batches and
+a snapshot thread periodically writes a compacted copy of `db` and drops the
+log segments it covers. On startup the newest snapshot is loaded and the log
+tail replayed; because each log entry carries a whole record, replay is
+idempotent and the snapshot does not need to be taken under a global lock.
+
+Layout of `DB_DATA_DIR`:
+    snapshot-<lsn>.json   full copy of `db` up to (and including) <lsn>
+    wal-<first_lsn>.log   JSON lines {"lsn", "t", "k", "v"}; no "v" = delete
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.database import db, register_change_listener, unregister_change_listener
+from core.models import AppointmentRecord
+
+# Tables whose values are objects rather than plain JSON dicts
+_DECODERS = {
+    "appointments": AppointmentRecord.from_dict,
+}
+
+
+def _encode(value):
+    return value.to_dict() if hasattr(value, "to_dict") else value
+
+
+def _encode_copy(value):
+    """Like `_encode`, but never returns a dict still shared with `db`."""
+    value = _encode(value)
+    return dict(value) if isinstance(value, dict) else value
+
+
+def _decode(table: str, value):
+    decoder = _DECODERS.get(table)
+    return decoder(value) if decoder else value
+
+
+def _lsn_of(filename: str) -> int:
+    return int(filename.split("-", 1)[1].split(".", 1)[0])
+
+
+class Persistence:
+    def __init__(self, data_dir: str, fsync_interval: float = 0.05, snapshot_interval: float = 300.0,
+                 snapshot_min_records: int = 1000, sync_commit: bool = False):
+        self.data_dir = data_dir
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_min_records = snapshot_min_records
+        self.sync_commit = sync_commit
+        self.recovery_stats: Optional[dict] = None
+
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._wal = None
+        self._segment = None
+        self._lsn = 0
+        self._flushed_lsn = 0
+        self._written_lsn = 0
+        self._snapshot_lsn = 0
+
+        os.makedirs(data_dir, exist_ok=True)
+
+    # --- files ---
+
+    def _files(self, prefix: str) -> List[str]:
+        names = [n for n in os.listdir(self.data_dir) if n.startswith(prefix + "-")]
+        return sorted(names, key=_lsn_of)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.data_dir, name)
+
+    def _open_segment(self) -> None:
+        self._segment = f"wal-{self._lsn + 1:012d}.log"
+        self._wal = open(self._path(self._segment), "a", encoding="utf-8")
+
+    def has_state(self) -> bool:
+        return bool(self._files("snapshot") or self._files("wal"))
+
+    # --- recovery ---
+
+    def recover(self) -> bool:
+        """Load the newest snapshot and replay the log tail into `db`.
+
+        Returns False (and leaves `db` untouched) when the directory is empty.
+        """
+        if not self.has_state():
+            return False
+
+        started = time.perf_counter()
+        snapshots = self._files("snapshot")
+        replayed = 0
+        if snapshots:
+            with open(self._path(snapshots[-1]), encoding="utf-8") as f:
+                snap = json.load(f)
+            for table, rows in snap["tables"].items():
+                if table in _DECODERS:
+                    db[table] = {k: _decode(table, v) for k, v in rows.items()}
+                else:
+                    db[table] = rows
+            self._snapshot_lsn = snap["lsn"]
+        loaded = sum(len(t) for t in db.values() if isinstance(t, dict))
+        self._lsn = self._snapshot_lsn
+
+        segments = self._files("wal")
+        for name in segments:
+            for rec in self._read_segment(name, last=name == segments[-1]):
+                if rec["lsn"] <= self._snapshot_lsn:
+                    continue
+                table = db.setdefault(rec["t"], {})
+                if "v" in rec:
+                    table[rec["k"]] = _decode(rec["t"], rec["v"])
+                else:
+                    table.pop(rec["k"], None)
+                self._lsn = rec["lsn"]
+                replayed += 1
+
+        self._written_lsn = self._flushed_lsn = self._lsn
+        elapsed = time.perf_counter() - started
+        total = loaded + replayed
+        self.recovery_stats = {
+            "snapshot_lsn": self._snapshot_lsn,
+            "snapshot_records": loaded,
+            "wal_records": replayed,
+            "seconds": round(elapsed, 4),
+            "records_per_sec": round(total / elapsed, 1) if elapsed > 0 else None,
+        }
+        print(f"[Persistence] Khôi phục {loaded} bản ghi từ snapshot (lsn={self._snapshot_lsn}) "
+              f"+ {replayed} bản ghi WAL trong {elapsed * 1000:.1f} ms "
+              f"({self.recovery_stats['records_per_sec']} rec/s)")
+        return True
+
+    def _read_segment(self, name: str, last: bool):
+        """Yield the records of one log segment.
+
+        Only the final segment may end in a torn write (a crash mid-append):
+        that tail is cut off so the segment stays valid once newer segments
+        follow it. A bad line anywhere else is corruption and raises
+        ValueError rather than silently dropping the rest of the log.
+        """
+        path = self._path(name)
+        good = 0
+        with open(path, "rb") as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                if last and not any(rest.strip() for rest in lines[i + 1:]):
+                    print(f"[Persistence] Cắt bản ghi hỏng ở cuối {name}")
+                    os.truncate(path, good)
+                    return
+                raise ValueError(f"WAL hỏng: {name} dòng {i + 1}")
+            good += len(line)
+            yield rec
+
+    # --- logging ---
+
+    def start(self) -> None:
+        """Open a fresh log segment and start the flusher/snapshot threads."""
+        with self._lock:
+            self._open_segment()
+        register_change_listener(self.log)
+        for target, name in ((self._flush_loop, "wal-flusher"), (self._snapshot_loop, "db-snapshotter")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        atexit.register(self.close)
+
+    def log(self, table: str, key: str, value) -> int:
+        """Append a put (or a delete when `value` is None) and return its LSN."""
+        with self._lock:
+            self._lsn += 1
+            lsn = self._lsn
+            rec = {"lsn": lsn, "t": table, "k": key}
+            if value is not None:
+                rec["v"] = _encode(value)
+            # Serialized under the lock so log order matches mutation order
+            self._wal.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+            self._written_lsn = lsn
+            if self.sync_commit:
+                while self._flushed_lsn < lsn and not self._stop.is_set():
+                    self._flushed.wait(self.fsync_interval * 4)
+        return lsn
+
+    def _flush_locked(self) -> None:
+        if self._wal is None or self._flushed_lsn >= self._written_lsn:
+            return
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._flushed_lsn = self._written_lsn
+        self._flushed.notify_all()
+
+    def _flush_loop(self) -> None:
+        # Group commit: one fsync covers every record written since the last one
+        while not self._stop.wait(self.fsync_interval):
+            with self._lock:
+                self._flush_locked()
+
+    # --- snapshots ---
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            if self._lsn - self._snapshot_lsn >= self.snapshot_min_records:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"[Persistence] Snapshot thất bại: {e}")
+
+    def _dump_tables(self) -> Dict[str, dict]:
+        tables = {}
+        for name in list(db.keys()):
+            table = db[name]
+            if not isinstance(table, dict):
+                continue
+            for attempt in range(5):
+                try:
+                    # Copy and encode in one pass: a record's own containers
+                    # (an appointment roster, a user dict) can change too
+                    tables[name] = {k: _encode_copy(v) for k, v in list(table.items())}
+                    break
+                except RuntimeError:
+                    # Resized by a concurrent writer; the WAL tail covers the difference
+                    if attempt == 4:
+                        raise RuntimeError(f"Bảng {name} thay đổi liên tục, bỏ lượt snapshot này")
+        return tables
+
+    def snapshot(self) -> int:
+        """Write a compacted snapshot and delete the log segments it covers."""
+        with self._snapshot_lock:
+            with self._lock:
+                self._flush_locked()
+                snap_lsn = self._lsn
+                old_segments = self._files("wal")
+                if self._wal is not None:
+                    self._wal.close()
+                self._open_segment()
+
+            started = time.perf_counter()
+            payload = {
+                "lsn": snap_lsn,
+                "created_at": datetime.now().isoformat(),
+                "tables": self._dump_tables(),
+            }
+            name = f"snapshot-{snap_lsn:012d}.json"
+            tmp = self._path(name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path(name))
+
+            for old in old_segments:
+                # An empty segment may be reopened under the same name
+                if old != self._segment:
+                    os.remove(self._path(old))
+            for old in self._files("snapshot")[:-1]:
+                os.remove(self._path(old))
+            self._snapshot_lsn = snap_lsn
+            print(f"[Persistence] Snapshot lsn={snap_lsn} ghi xong trong "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms")
+            return snap_lsn
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        unregister_change_listener(self.log)
+        for t in self._threads:
+            t.join(timeout=2)
+        with self._lock:
+            self._flush_locked()
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+
+_active: Optional[Persistence] = None
+
+
+def get_persistence() -> Optional[Persistence]:
+    return _active
+
+
+def open_from_env() -> Optional[Persistence]:
+    """Create the process-wide `Persistence` from environment variables.
+
+    DB_DATA_DIR (required to enable), DB_FSYNC_INTERVAL_MS (50),
+    DB_SNAPSHOT_INTERVAL_S (300), DB_SNAPSHOT_MIN_RECORDS (1000),
+    DB_WAL_SYNC_COMMIT ("1" = wait for fsync before returning from a write).
+    """
+    global _active
+    if _active is not None:
+        return _active
+    data_dir = os.environ.get("DB_DATA_DIR")
+    if not data_dir:
+        return None
+    _active = Persistence(
+        data_dir,
+        fsync_interval=int(os.environ.get("DB_FSYNC_INTERVAL_MS", "50")) / 1000.0,
+        snapshot_interval=float(os.environ.get("DB_SNAPSHOT_INTERVAL_S", "300")),
+        snapshot_min_records=int(os.environ.get("DB_SNAPSHOT_MIN_RECORDS", "1000")),
+        sync_commit=os.environ.get("DB_WAL_SYNC_COMMIT") == "1",
+    )
+    return _active
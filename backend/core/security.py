@@ -1,8 +1,98 @@
 # core/security.py
+from collections import OrderedDict
 from functools import wraps
 from flask import request, jsonify, current_app, g
+import hashlib
+import os
+import threading
+import time
 import jwt
-from core.database import db
+from core.database import db, register_change_listener, register_rebuild_hook
+
+
+class _VerifiedTokenCache:
+    """Bounded LRU of already-verified JWTs, keyed by a SHA-256 of the token.
+
+    An entry holds the decoded payload and a password-free view of the user.
+    It is dropped at the token's `exp`, and ignored once the user's record has
+    changed since it was cached (role grant, profile sync, booking, ...).
+    Every hit returns shallow copies, so a route that edits its request's
+    user or payload cannot leak the change into later requests.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()   # digest -> (exp, secret, user_id, version, payload, user_view)
+        self._user_versions = {}        # user_id -> change counter
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token: str, secret: str):
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            exp, cached_secret, user_id, version, payload, user_view = entry
+            if (cached_secret != secret
+                    or (exp is not None and time.time() >= exp)
+                    or self._user_versions.get(user_id, 0) != version
+                    or user_id not in db['users']):
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(payload), user_id, dict(user_view)
+
+    def user_version(self, user_id: str) -> int:
+        """Read before copying the user: `put` caches the view under this version."""
+        with self._lock:
+            return self._user_versions.get(user_id, 0)
+
+    def put(self, token: str, secret: str, payload: dict, user_id: str, user_view: dict,
+            version: int) -> None:
+        """Cache `user_view` as of `version` (from `user_version`, taken before the copy).
+
+        A change that lands between the read and the copy bumps the version,
+        so the entry is already stale and the next `get` drops it.
+        """
+        exp = payload.get('exp')
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (exp, secret, user_id, version, dict(payload), dict(user_view))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_versions.clear()
+
+
+token_cache = _VerifiedTokenCache(int(os.environ.get('TOKEN_CACHE_SIZE', '4096')))
+
+
+@register_change_listener
+def _on_db_change(table, key, value):
+    if table == 'users':
+        token_cache.invalidate_user(key)
+
+
+@register_rebuild_hook
+def _on_db_reload():
+    token_cache.clear()
 
 
 def parse_bearer_token(req):
@@ -16,7 +106,9 @@ def parse_bearer_token(req):
 def require_login(f):
     """Decorator: validate JWT, attach `g.user_id` and `g.current_user`.
 
-    Use this everywhere instead of decoding tokens locally.
+    Use this everywhere instead of decoding tokens locally. Verified tokens
+    are cached (see `_VerifiedTokenCache`); `g.current_user` is a per-request
+    copy of the cached user view.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -24,21 +116,35 @@ def require_login(f):
         if not token:
             return jsonify({'error': 'Unauthorized: missing token'}), 401
 
-        secret = current_app.config.get('SECRET_KEY', 'dev-secret')
-        try:
-            payload = jwt.decode(token, secret, algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-
-        user_id = payload.get('user_id')
-        if not user_id or user_id not in db['users']:
-            return jsonify({'error': 'Unauthorized: user not found'}), 401
-
-        user = db['users'][user_id].copy()
-        user.pop('password', None)
+        # Already verified by an outer decorator in this request (require_role + require_login)
+        if g.get('_verified_token') == token:
+            return f(*args, **kwargs)
 
+        secret = current_app.config.get('SECRET_KEY', 'dev-secret')
+        cached = token_cache.get(token, secret)
+        if cached is not None:
+            payload, user_id, user = cached
+        else:
+            try:
+                payload = jwt.decode(token, secret, algorithms=['HS256'])
+            except jwt.ExpiredSignatureError:
+                return jsonify({'error': 'Token expired'}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({'error': 'Invalid token'}), 401
+
+            user_id = payload.get('user_id')
+            if not user_id or user_id not in db['users']:
+                return jsonify({'error': 'Unauthorized: user not found'}), 401
+
+            version = token_cache.user_version(user_id)
+            user = db['users'].get(user_id)
+            if user is None:
+                return jsonify({'error': 'Unauthorized: user not found'}), 401
+            user = user.copy()
+            user.pop('password', None)
+            token_cache.put(token, secret, payload, user_id, user, version)
+
+        g._verified_token = token
         g.token_payload = payload
         g.user_id = user_id
         g.current_user = user
@@ -61,7 +167,9 @@ def _role_name(role_obj):
 
 
 def require_role(allowed_role):
-    """Decorator to require a specific role. Uses `require_login` first."""
+    """Decorator to require a specific role (or any of several roles). Uses `require_login` first."""
+    allowed = {allowed_role} if isinstance(allowed_role, str) else set(allowed_role)
+
     def decorator(f):
         @require_login
         @wraps(f)
@@ -71,7 +179,7 @@ def require_role(allowed_role):
                 return jsonify({'error': 'Unauthorized'}), 401
 
             role_name = _role_name(user.get('role'))
-            if role_name != allowed_role:
+            if role_name not in allowed:
                 return jsonify({'error': 'Forbidden: insufficient role'}), 403
 
             return f(*args, **kwargs)
@@ -0,0 +1,29 @@
+# core/user_view.py
+"""Public (password-free) rendering of user records, shared by the listing endpoints."""
+from typing import Iterable, Optional
+
+# Sort keys accepted by the paginated user listings (`?sort=name`, `?sort=-email`)
+USER_SORT_KEYS = {
+    'id': lambda u: u.get('id'),
+    'name': lambda u: u.get('name'),
+    'email': lambda u: u.get('email'),
+    'role': lambda u: u.get('role'),
+}
+
+
+def public_user(u: dict, fields: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """Copy of `u` without the password, optionally projected onto `fields`."""
+    if not u:
+        return None
+    if fields:
+        user_copy = {k: u[k] for k in fields if k in u and k != 'password'}
+    else:
+        user_copy = u.copy()
+        user_copy.pop('password', None)
+
+    role = user_copy.get('role')
+    if hasattr(role, 'name'):
+        user_copy['role'] = role.name
+    elif isinstance(role, dict):
+        user_copy['role'] = role.get('name', 'UNKNOWN')
+    return user_copy
@@ -2,28 +2,26 @@
 from flask import Blueprint, request, jsonify
 from core.database import db, set_user_role
 from core.security import require_role
+from core.password_pool import get_password_pool
+from core.pagination import paginate_table, PageError
+from core.user_view import USER_SORT_KEYS, public_user
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-def _public_user(u: dict) -> dict:
-    if not u:
-        return None
-    user_copy = u.copy()
-    user_copy.pop('password', None)
-    
-    role = user_copy.get('role')
-    if hasattr(role, 'name'):
-        user_copy['role'] = role.name
-    elif isinstance(role, dict):
-        user_copy['role'] = role.get('name', 'UNKNOWN')
-    return user_copy
-
 
 @bp.route('/users', methods=['GET'])
 @require_role('ADMIN')
 def list_users():
-    users_list = [_public_user(u) for u in db['users'].values()]
-    return jsonify({'count': len(users_list), 'users': users_list}), 200
+    try:
+        page = paginate_table('users', request.args, USER_SORT_KEYS, public_user)
+    except PageError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'count': len(page['items']),
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+        'users': page['items'],
+    }), 200
 
 
 @bp.route('/grant-role', methods=['POST'])
@@ -40,7 +38,14 @@ def grant_role():
         updated_user = db['users'][user_id]
         return jsonify({
             'message': f'Đã cập nhật quyền {role} thành công',
-            'user': _public_user(updated_user)
+            'user': public_user(updated_user)
         }), 200
     
-    return jsonify({'error': 'User không tồn tại'}), 404
\ No newline at end of file
+    return jsonify({'error': 'User không tồn tại'}), 404
+
+
+@bp.route('/metrics/password-pool', methods=['GET'])
+@require_role('ADMIN')
+def password_pool_metrics():
+    """Queue depth, rejections and hash latency of the bcrypt worker pool."""
+    return jsonify(get_password_pool().metrics()), 200
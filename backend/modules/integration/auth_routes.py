@@ -3,11 +3,19 @@ import os
 from modules.integration.services import AuthService
 from core.security import require_login
 from core.database import db, create_user
+from core.password_pool import PasswordPoolBusy
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 auth_service = AuthService()
 
 
+def _busy_response(err: PasswordPoolBusy):
+    """Fast 503 when the bcrypt pool is saturated, instead of queueing the request."""
+    resp = jsonify({'error': str(err)})
+    resp.headers['Retry-After'] = str(err.retry_after)
+    return resp, 503
+
+
 @bp.route('/sso/login-url', methods=['GET'])
 def get_sso_url():
     try:
@@ -112,6 +120,8 @@ def register():
         }), 201
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except PasswordPoolBusy as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({'error': 'Lỗi server khi đăng ký'}), 500
 
@@ -127,8 +137,11 @@ def verify_credentials():
     if not email or not password:
         return jsonify({'error': 'Missing credentials'}), 400
     
-    # Authenticate using bcrypt
-    user_id = authenticate(email, password)
+    # Authenticate using bcrypt (on the password worker pool)
+    try:
+        user_id = authenticate(email, password)
+    except PasswordPoolBusy as e:
+        return _busy_response(e)
     
     if user_id:
         user = get_user_by_email(email)
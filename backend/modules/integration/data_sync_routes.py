@@ -2,21 +2,29 @@ from flask import Blueprint, request, jsonify
 from core.security import require_role
 from core.models import SyncTypeEnum
 
-from modules.integration.services import DataSyncService, SchedulerService
+from modules.integration.services import DataSyncService, SchedulerService, SYNC_HISTORY_LIMIT
+from modules.integration.sync_jobs import get_sync_jobs, DuplicateSyncJob
 
 bp = Blueprint('data_sync', __name__, url_prefix='/sync')
 
 sync_service = DataSyncService()
 scheduler_service = SchedulerService()
 
+def _start_job(sync_type: SyncTypeEnum, fn):
+    """Xếp một lượt đồng bộ vào hàng đợi nền; 202 kèm job, 409 nếu đã có job cùng loại."""
+    try:
+        job = get_sync_jobs().submit(sync_type.value, fn)
+    except DuplicateSyncJob as e:
+        return jsonify({'error': str(e), 'job': e.job.to_dict()}), 409
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'message': 'Đã xếp hàng job đồng bộ', 'job': job.to_dict()}), 202
+
+
 @bp.route('/personal/scheduled', methods=['POST'])
 @require_role('ADMIN')
 def trigger_scheduled_personal_sync():
-    try:
-        report = sync_service.run_scheduled_personal_data_sync()
-        return jsonify(report.to_dict()), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _start_job(SyncTypeEnum.PERSONAL, sync_service.run_scheduled_personal_data_sync)
 
 @bp.route('/personal/manual', methods=['POST'])
 @require_role('ADMIN')
@@ -36,11 +44,40 @@ def trigger_manual_personal_sync():
 @bp.route('/roles', methods=['POST'])
 @require_role('ADMIN')
 def trigger_role_sync():
-    try:
-        report = sync_service.run_scheduled_role_sync()
-        return jsonify(report.to_dict()), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _start_job(SyncTypeEnum.ROLE, sync_service.run_scheduled_role_sync)
+
+
+@bp.route('/jobs', methods=['GET'])
+@require_role('ADMIN')
+def list_sync_jobs():
+    """Các job đồng bộ gần đây (mới nhất trước). Query: type=PERSONAL|ROLE (tuỳ chọn)."""
+    type_str = request.args.get('type')
+    kind = type_str.upper() if type_str else None
+    if kind and kind not in SyncTypeEnum.__members__:
+        return jsonify({'error': 'Invalid sync type. Must be PERSONAL or ROLE'}), 400
+    jobs = [job.to_dict() for job in get_sync_jobs().list(kind)]
+    return jsonify({'count': len(jobs), 'jobs': jobs}), 200
+
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@require_role('ADMIN')
+def get_sync_job(job_id):
+    job = get_sync_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@require_role('ADMIN')
+def cancel_sync_job(job_id):
+    """Yêu cầu huỷ; job đang chạy dừng sau chunk hiện tại."""
+    job = get_sync_jobs().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    if not job.cancelled:
+        return jsonify({'error': 'Job đã kết thúc', 'job': job.to_dict()}), 409
+    return jsonify({'message': 'Đã yêu cầu huỷ job', 'job': job.to_dict()}), 202
 
 @bp.route('/status', methods=['GET'])
 @require_role('ADMIN')
@@ -50,10 +87,19 @@ def get_sync_status():
     if not type_str:
         return jsonify({'error': 'Missing type parameter (PERSONAL or ROLE)'}), 400
 
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit phải là số nguyên'}), 400
+    if not 0 <= limit <= SYNC_HISTORY_LIMIT:
+        return jsonify({'error': f'limit phải trong khoảng 0..{SYNC_HISTORY_LIMIT}'}), 400
+
     try:
         sync_type = SyncTypeEnum(type_str.upper())
         status = sync_service.get_latest_sync_status(sync_type)
-        return jsonify(status.to_dict()), 200
+        # Lịch sử các lượt gần nhất (thời gian từng pha, bản ghi/s, mẫu lỗi) để theo dõi hiệu năng
+        history = sync_service.get_sync_history(sync_type, limit)
+        return jsonify({**status.to_dict(), 'history': history}), 200
         
     except ValueError:
         return jsonify({'error': 'Invalid sync type. Must be PERSONAL or ROLE'}), 400
@@ -0,0 +1,123 @@
+# backend/modules/integration/feedback_index.py
+"""Time-ordered index of appointment feedback for `GET /info/feedbacks/all`.
+
+Each feedback entry is keyed by (created_at, appointment id, position in the
+appointment's feedback list). The global list and the per-tutor /
+per-appointment lists are sorted by that key, so a newest-first page before a
+cursor is a bisect plus a walk over `limit` entries of the narrowest list.
+The cursor is the key itself, built from stored data, so it survives index
+rebuilds and server restarts. Rating filters can skip many entries, so a
+page walks at most `MAX_SCAN` of them and may come back short, with a
+`next_cursor` to continue from. Names are joined only for the returned page.
+"""
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from core.database import db, register_rebuild_hook
+
+# Entries examined per filtered page before returning a continuation cursor
+MAX_SCAN = 2000
+
+# (created_at, appointment id, position)
+FeedbackKey = Tuple[str, str, int]
+
+
+class FeedbackIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[FeedbackKey] = []
+        self._entries: Dict[FeedbackKey, tuple] = {}  # key -> (rating, tutor_id)
+        self._by_tutor: Dict[str, List[FeedbackKey]] = {}
+        self._by_apt: Dict[str, List[FeedbackKey]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._entries.clear()
+            self._by_tutor.clear()
+            self._by_apt.clear()
+
+    def rebuild(self, appointments) -> None:
+        keys, entries, by_tutor, by_apt = [], {}, {}, {}
+        for apt in list(appointments.values()):
+            for pos, fb in enumerate(apt.feedback or ()):
+                key = (fb.get("created_at") or "", apt.id, pos)
+                keys.append(key)
+                entries[key] = (fb.get("rating"), apt.tutor_id)
+                by_tutor.setdefault(apt.tutor_id, []).append(key)
+                by_apt.setdefault(apt.id, []).append(key)
+        keys.sort()
+        for lists in (by_tutor, by_apt):
+            for bucket in lists.values():
+                bucket.sort()
+        with self._lock:
+            self._keys, self._entries = keys, entries
+            self._by_tutor, self._by_apt = by_tutor, by_apt
+
+    def append(self, apt, position: int) -> FeedbackKey:
+        """Index `apt.feedback[position]`, just added to the appointment."""
+        fb = apt.feedback[position]
+        key = (fb.get("created_at") or "", apt.id, position)
+        with self._lock:
+            # New feedback is almost always the newest, so these land at the end
+            insort(self._keys, key)
+            self._entries[key] = (fb.get("rating"), apt.tutor_id)
+            insort(self._by_tutor.setdefault(apt.tutor_id, []), key)
+            insort(self._by_apt.setdefault(apt.id, []), key)
+        return key
+
+    def page(self, tutor_id: Optional[str] = None, appointment_id: Optional[str] = None,
+             min_rating: Optional[int] = None, max_rating: Optional[int] = None,
+             before: Optional[FeedbackKey] = None,
+             limit: Optional[int] = None,
+             max_scan: int = MAX_SCAN) -> Tuple[List[tuple], Optional[FeedbackKey]]:
+        """Return ([(apt_id, position), ...] newest first, key cursor for the next page or None).
+
+        With a `limit`, at most `max_scan` entries are examined; if the walk
+        stops there the page may hold fewer than `limit` matches (even none)
+        and the cursor points past the last entry examined.
+        """
+        with self._lock:
+            if appointment_id is not None:
+                keys = self._by_apt.get(appointment_id, [])
+            elif tutor_id is not None:
+                keys = self._by_tutor.get(tutor_id, [])
+            else:
+                keys = self._keys
+            i = len(keys) if before is None else bisect_left(keys, tuple(before))
+
+            found, next_before = [], None
+            scanned = 0
+            while i > 0:
+                if limit is not None and scanned >= max_scan:
+                    # Sparse filter: stop here and let the caller continue below keys[i]
+                    next_before = keys[i]
+                    break
+                scanned += 1
+                i -= 1
+                key = keys[i]
+                rating, tutor = self._entries[key]
+                if tutor_id is not None and tutor != tutor_id:
+                    continue
+                if min_rating is not None and (rating is None or rating < min_rating):
+                    continue
+                if max_rating is not None and (rating is None or rating > max_rating):
+                    continue
+                if limit is not None and len(found) == limit:
+                    # One more match exists past this page
+                    next_before = found[-1]
+                    break
+                found.append(key)
+        return [(apt_id, pos) for _, apt_id, pos in found], next_before
+
+
+feedback_index = FeedbackIndex()
+
+
+@register_rebuild_hook
+def rebuild_feedback_index() -> None:
+    feedback_index.rebuild(db.get("appointments", {}))
@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify, g, current_app
-from core.database import db
+from core.database import db, mark_dirty
 from core.security import require_login, require_role
+from core.pagination import paginate_table, project, encode_key, decode_key, PageError, MAX_LIMIT
+from core.user_view import USER_SORT_KEYS, public_user
+from modules.integration.feedback_index import feedback_index
+from modules.scheduling.logic import list_student_appointments, add_feedback as add_appointment_feedback, LogicError
 from datetime import datetime
 
 bp = Blueprint('info', __name__, url_prefix='/info')
@@ -21,6 +25,37 @@ def _check_roles(allowed):
     return role_name in allowed
 
 
+# Sort keys accepted by the paginated listings (`?sort=name`, `?sort=-created_at`)
+APPOINTMENT_SORT_KEYS = {
+    'id': lambda a: a.id,
+    'start_time': lambda a: a.start,
+    'end_time': lambda a: a.end,
+    'name': lambda a: a.name,
+    'tutor_id': lambda a: a.tutor_id,
+    'status': lambda a: a.status,
+}
+DOCUMENT_SORT_KEYS = {
+    'id': lambda d: d.get('id'),
+    'created_at': lambda d: d.get('created_at'),
+    'title': lambda d: d.get('title'),
+    'course_code': lambda d: d.get('course_code'),
+}
+
+
+def _paged_response(key, table, sort_keys, render):
+    """Shared body of the listing endpoints: count/total/next_cursor + items."""
+    try:
+        page = paginate_table(table, request.args, sort_keys, render)
+    except PageError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'count': len(page['items']),
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+        key: page['items'],
+    }), 200
+
+
 @bp.route('/overview', methods=['GET'])
 @require_login
 def overview():
@@ -43,12 +78,7 @@ def list_users():
     if not _check_roles(allowed):
         return jsonify({'error': 'Forbidden'}), 403
 
-    users = []
-    for u in db.get('users', {}).values():
-        uu = u.copy()
-        uu.pop('password', None)
-        users.append(uu)
-    return jsonify({'count': len(users), 'users': users}), 200
+    return _paged_response('users', 'users', USER_SORT_KEYS, public_user)
 
 
 @bp.route('/appointments', methods=['GET'])
@@ -58,8 +88,8 @@ def list_appointments():
     if not _check_roles(allowed):
         return jsonify({'error': 'Forbidden'}), 403
 
-    apts = list(db.get('appointments', {}).values())
-    return jsonify({'count': len(apts), 'appointments': apts}), 200
+    return _paged_response('appointments', 'appointments', APPOINTMENT_SORT_KEYS,
+                           lambda a, fields: a.to_dict(fields))
 
 
 @bp.route('/appointments/mine', methods=['GET'])
@@ -74,10 +104,9 @@ def my_appointments():
     if not uid:
         return jsonify({'error': 'Forbidden'}), 403
 
-    result = []
-    for appt in db.get('appointments', {}).values():
-        if uid in appt.get('current_slots', []) or appt.get('id') in db.get('users', {}).get(uid, {}).get('booked_appointments', []):
-            result.append(appt)
+    # Reverse index student -> appointments, already sorted by start time
+    upcoming = request.args.get('upcoming', '').lower() in ('1', 'true', 'yes')
+    result = list_student_appointments(uid, upcoming=upcoming)
 
     return jsonify({'count': len(result), 'appointments': result}), 200
 
@@ -114,61 +143,88 @@ def submit_feedback(appt_id):
         'created_at': datetime.utcnow().isoformat() + 'Z'
     }
 
-    # Append feedback (create list if missing)
-    if 'feedback' not in appt or appt.get('feedback') is None:
-        appt['feedback'] = []
-
-    appt['feedback'].append(feedback_entry)
-    db['appointments'][appt_id] = appt
+    try:
+        # Append and index under the appointment's lock so concurrent submits get distinct positions
+        add_appointment_feedback(appt_id, feedback_entry, on_added=feedback_index.append)
+    except LogicError as e:
+        return jsonify({'error': e.message}), e.status_code
 
     return jsonify({'feedback': feedback_entry}), 201
 
 
+def _int_arg(name, low=None, high=None):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        value = int(raw)
+    except ValueError:
+        raise PageError(f'{name} phải là số nguyên')
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise PageError(f'{name} phải trong khoảng {low}..{high}')
+    return value
+
+
+def _render_feedback(appt, fb, users):
+    student_id = fb.get('student_id')
+    student = users.get(student_id, {})
+    tutor = users.get(appt.tutor_id, {})
+    return {
+        'feedback_id': f"{appt.id}_{student_id}_{fb.get('created_at', '')}",
+        'appointment_id': appt.id,
+        'appointment_name': appt.name,
+        'start_time': appt.start_time,
+        'place': appt.place,
+        'tutor_name': tutor.get('name', 'Unknown'),
+        'student_id': student_id,
+        'student_name': student.get('name', 'Unknown'),
+        'student_email': student.get('email', 'N/A'),
+        'rating': fb.get('rating'),
+        'comment': fb.get('comment', ''),
+        'created_at': fb.get('created_at', '')
+    }
+
+
 @bp.route('/feedbacks/all', methods=['GET'])
 @require_role('UNIVERSITY_OFFICER')
 def get_all_feedbacks():
     """
-    UNIVERSITY_OFFICER xem tất cả feedbacks từ mọi appointments.
-    Trả về danh sách feedbacks với thông tin appointment và student.
+    UNIVERSITY_OFFICER xem tất cả feedbacks từ mọi appointments, mới nhất trước.
+    Query (tuỳ chọn): limit, cursor (từ next_cursor), tutor_id, appointment_id,
+    min_rating, max_rating. Đọc từ feedback_index nên mỗi trang chỉ tốn O(limit);
+    với bộ lọc rating thưa, một trang xét tối đa feedback_index.MAX_SCAN mục và có thể
+    trả ít hơn limit kèm next_cursor để đọc tiếp.
     """
+    try:
+        limit = _int_arg('limit', 1, MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        cursor = decode_key(cursor, (str, str, int)) if cursor else None
+        min_rating = _int_arg('min_rating')
+        max_rating = _int_arg('max_rating')
+    except PageError as e:
+        return jsonify({'error': str(e)}), 400
+
+    entries, next_cursor = feedback_index.page(
+        tutor_id=request.args.get('tutor_id') or None,
+        appointment_id=request.args.get('appointment_id') or None,
+        min_rating=min_rating,
+        max_rating=max_rating,
+        before=cursor,
+        limit=limit,
+    )
+
+    appts = db.get('appointments', {})
+    users = db.get('users', {})
     all_feedbacks = []
-    
-    for appt_id, appt in db.get('appointments', {}).items():
-        feedbacks = appt.get('feedback', [])
-        if not feedbacks:
+    for appt_id, pos in entries:
+        appt = appts.get(appt_id)
+        if appt is None or not appt.feedback or pos >= len(appt.feedback):
             continue
-            
-        for fb in feedbacks:
-            student_id = fb.get('student_id')
-            student = db.get('users', {}).get(student_id, {})
-            student_name = student.get('name', 'Unknown')
-            student_email = student.get('email', 'N/A')
-            
-            # Lấy thông tin tutor
-            tutor_id = appt.get('tutor_id')
-            tutor = db.get('users', {}).get(tutor_id, {})
-            tutor_name = tutor.get('name', 'Unknown')
-            
-            all_feedbacks.append({
-                'feedback_id': f"{appt_id}_{student_id}_{fb.get('created_at', '')}",
-                'appointment_id': appt_id,
-                'appointment_name': appt.get('name', 'N/A'),
-                'start_time': appt.get('start_time', 'N/A'),
-                'place': appt.get('place', 'N/A'),
-                'tutor_name': tutor_name,
-                'student_id': student_id,
-                'student_name': student_name,
-                'student_email': student_email,
-                'rating': fb.get('rating'),
-                'comment': fb.get('comment', ''),
-                'created_at': fb.get('created_at', '')
-            })
-    
-    # Sort by created_at desc
-    all_feedbacks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    
+        all_feedbacks.append(_render_feedback(appt, appt.feedback[pos], users))
+
     return jsonify({
         'count': len(all_feedbacks),
+        'next_cursor': encode_key(next_cursor) if next_cursor else None,
         'feedbacks': all_feedbacks
     }), 200
 
@@ -180,8 +236,7 @@ def list_documents():
     if not _check_roles(allowed):
         return jsonify({'error': 'Forbidden'}), 403
 
-    docs = list(db.get('documents', {}).values())
-    return jsonify({'count': len(docs), 'documents': docs}), 200
+    return _paged_response('documents', 'documents', DOCUMENT_SORT_KEYS, project)
 
 
 @bp.route('/users/<user_id>', methods=['PATCH'])
@@ -204,6 +259,5 @@ def update_user(user_id):
 
     # persist (in-memory) and return sanitized user
     db['users'][user_id] = user
-    u = user.copy()
-    u.pop('password', None)
-    return jsonify({'user': u}), 200
+    mark_dirty('users', user_id)
+    return jsonify({'user': public_user(user)}), 200
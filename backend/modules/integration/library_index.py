@@ -0,0 +1,251 @@
+# backend/modules/integration/library_index.py
+"""Inverted index used by `GET /library/` search.
+
+Documents are tokenized on title, description and course code after folding
+Vietnamese diacritics ("Công nghệ" -> "cong nghe"), so a query only touches
+the posting lists of its own terms instead of every document in the catalog.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.database import db, register_rebuild_hook
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Title hits matter more than course code hits, which matter more than description hits
+FIELD_WEIGHTS = {"title": 3.0, "course_code": 2.0, "description": 1.0}
+
+
+def fold_text(text: str) -> str:
+    """Lowercase and strip Vietnamese diacritics ('đ' -> 'd', 'ệ' -> 'e')."""
+    if not text:
+        return ""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn").lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold_text(text))
+
+
+class DocumentSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[str, float]] = {}   # token -> {doc_id: weight}
+        self._vocab: List[str] = []                        # sorted tokens, for prefix lookups
+        self._doc_tokens: Dict[str, Set[str]] = {}         # doc_id -> tokens (for re-indexing)
+        self._doc_course: Dict[str, str] = {}              # doc_id -> course code (upper)
+        self._courses: Dict[str, Dict[str, None]] = {}     # course code -> ordered doc ids
+        self._order: Dict[str, int] = {}                   # doc_id -> insertion rank
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._vocab.clear()
+            self._doc_tokens.clear()
+            self._doc_course.clear()
+            self._courses.clear()
+            self._order.clear()
+            self._seq = 0
+
+    def rebuild(self, docs: Iterable[dict]) -> None:
+        self.clear()
+        for doc in docs:
+            self.add(doc)
+
+    def add(self, doc: dict) -> None:
+        """Index (or re-index) one document dict."""
+        doc_id = doc["id"]
+        weights: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(doc.get(field, "")):
+                weights[token] = weights.get(token, 0.0) + weight
+        course = (doc.get("course_code") or "").upper()
+
+        with self._lock:
+            self._remove_locked(doc_id)
+            for token, weight in weights.items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = {}
+                    insort(self._vocab, token)
+                posting[doc_id] = weight
+            self._doc_tokens[doc_id] = set(weights)
+            self._doc_course[doc_id] = course
+            self._courses.setdefault(course, {})[doc_id] = None
+            self._order[doc_id] = self._seq
+            self._seq += 1
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        if doc_id not in self._order:
+            return
+        for token in self._doc_tokens.pop(doc_id, ()):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[token]
+                pos = bisect_left(self._vocab, token)
+                if pos < len(self._vocab) and self._vocab[pos] == token:
+                    del self._vocab[pos]
+        course = self._doc_course.pop(doc_id, "")
+        course_docs = self._courses.get(course)
+        if course_docs is not None:
+            course_docs.pop(doc_id, None)
+            if not course_docs:
+                del self._courses[course]
+        del self._order[doc_id]
+
+    def _prefix_postings(self, prefix: str) -> Dict[str, float]:
+        """Merge postings of every token starting with `prefix` (best weight per doc)."""
+        merged: Dict[str, float] = {}
+        pos = bisect_left(self._vocab, prefix)
+        while pos < len(self._vocab) and self._vocab[pos].startswith(prefix):
+            for doc_id, weight in self._postings[self._vocab[pos]].items():
+                if weight > merged.get(doc_id, 0.0):
+                    merged[doc_id] = weight
+            pos += 1
+        return merged
+
+    def search(self, query: str = "", course: str = "", limit: Optional[int] = None,
+               offset: int = 0) -> Tuple[int, List[str]]:
+        """Return (total_matches, doc_ids for the requested page).
+
+        Every query term must match (the last one as a prefix, so partially
+        typed words still hit). Results are ranked by field-weighted tf-idf;
+        without a query the catalog order is kept. A query with no searchable
+        term (only punctuation or spaces) matches nothing.
+        """
+        terms = tokenize(query)
+        if query and not terms:
+            return 0, []
+        course = (course or "").upper()
+
+        with self._lock:
+            allowed = None
+            if course:
+                allowed = set()
+                for code, doc_ids in self._courses.items():
+                    if course in code:
+                        allowed.update(doc_ids)
+
+            if not terms:
+                if allowed is None:
+                    ordered = list(self._order)
+                else:
+                    ordered = sorted(allowed, key=self._order.__getitem__)
+                end = None if limit is None else offset + limit
+                return len(ordered), ordered[offset:end]
+
+            total_docs = max(len(self._order), 1)
+            term_postings = []
+            for i, term in enumerate(terms):
+                if i == len(terms) - 1:
+                    posting = self._prefix_postings(term)
+                else:
+                    posting = self._postings.get(term, {})
+                if not posting:
+                    return 0, []
+                term_postings.append(posting)
+
+            # Intersect starting from the rarest term
+            term_postings.sort(key=len)
+            candidates = set(term_postings[0])
+            if allowed is not None:
+                candidates &= allowed
+            for posting in term_postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return 0, []
+
+            idfs = [math.log(1.0 + total_docs / len(p)) for p in term_postings]
+            scored = []
+            for doc_id in candidates:
+                score = sum(p[doc_id] * idf for p, idf in zip(term_postings, idfs))
+                scored.append((score, -self._order[doc_id], doc_id))
+
+        if limit is None:
+            scored.sort(reverse=True)
+            page = scored[offset:]
+        else:
+            page = heapq.nlargest(offset + limit, scored)[offset:]
+        return len(scored), [doc_id for _, _, doc_id in page]
+
+
+class AccessHistoryIndex:
+    """Per-user access-log ids in time order, for paging `/library/history`.
+
+    A user's logs are kept sorted by (timestamp, log_id), so a newest-first
+    page before a cursor is a bisect plus a slice of that user's own entries.
+    The cursor is that key itself: it is taken from the stored logs, so it
+    stays valid across index rebuilds and server restarts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user: Dict[str, List[Tuple[str, str]]] = {}  # user_id -> sorted (timestamp, log_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_user.clear()
+
+    def rebuild(self, logs: Iterable[dict]) -> None:
+        by_user: Dict[str, List[Tuple[str, str]]] = {}
+        for log in logs:
+            by_user.setdefault(log["user_id"], []).append((log["timestamp"], log["id"]))
+        for keys in by_user.values():
+            keys.sort()
+        with self._lock:
+            self._by_user = by_user
+
+    def append(self, user_id: str, log_id: str, timestamp: str) -> Tuple[str, str]:
+        key = (timestamp, log_id)
+        with self._lock:
+            # New logs are almost always the newest, so this lands at the end
+            insort(self._by_user.setdefault(user_id, []), key)
+        return key
+
+    def page(self, user_id: str, before: Optional[Tuple[str, str]] = None,
+             limit: Optional[int] = None) -> Tuple[List[str], Optional[Tuple[str, str]]]:
+        """Return (log_ids newest first, (timestamp, log_id) cursor for the next page or None)."""
+        with self._lock:
+            keys = self._by_user.get(user_id)
+            if not keys:
+                return [], None
+            end = len(keys) if before is None else bisect_left(keys, tuple(before))
+            start = 0 if limit is None else max(end - limit, 0)
+            page = [log_id for _, log_id in keys[start:end]]
+            next_before = keys[start] if start > 0 else None
+        page.reverse()
+        return page, next_before
+
+
+search_index = DocumentSearchIndex()
+
+
+@register_rebuild_hook
+def rebuild_search_index() -> None:
+    search_index.rebuild(db.get("documents", {}).values())
+
+
+history_index = AccessHistoryIndex()
+
+
+@register_rebuild_hook
+def rebuild_history_index() -> None:
+    history_index.rebuild(db.get("access_logs", {}).values())
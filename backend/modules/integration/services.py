@@ -1,6 +1,11 @@
 # backend/modules/integration/services.py
+import os
 import time
 import uuid
+import hashlib
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import jwt
 import requests
 from datetime import datetime, timedelta
@@ -11,8 +16,9 @@ from core.models import (
     User, Role, Permission, SyncReport, SyncStatusEnum, 
     SyncStatus, SyncTypeEnum, AuthResult, SsoLogoutUrl, UserProfile, SchedulerConfig
 )
-from core.database import db
+from core.database import db, update_user_email, mark_dirty
 from extensions import scheduler
+from modules.integration.sync_jobs import is_shutdown_error
 
 # Mock clients
 class MockDataCoreClient:
@@ -69,7 +75,7 @@ class MockDataCoreClient:
         return list(self.DATACORE_DB.keys())
     
     def fetch_user_profiles(self, user_ids: List[str]):
-        print(f"[MockDataCore] Đang trích xuất hồ sơ chi tiết cho: {user_ids}")
+        print(f"[MockDataCore] Đang trích xuất hồ sơ chi tiết cho {len(user_ids)} user")
         results = []
         for uid in user_ids:
             if uid in self.DATACORE_DB:
@@ -114,61 +120,121 @@ class HttpSSOClient:
             raise Exception(f"SSO Error: {resp.text}")
         except Exception as e: raise e
 
+def profile_hash(user_data: dict) -> str:
+    """Dấu vân tay nội dung của một hồ sơ DataCore (không phụ thuộc thứ tự khoá)."""
+    raw = json.dumps(user_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
 # Exceptions
 class UserDataProcessingError(Exception): pass
 class RoleProcessingError(Exception): pass
+class SyncCancelled(Exception): pass
 
 # Repositories
 class UserRepository:
     def get_all_users(self) -> List[User]:
         return list(db['users'].values())
 
-    def update_or_create(self, user_data: dict):
+    def update_or_create(self, user_data: dict) -> Optional[str]:
+        """Trả về "updated" / "created", hoặc None nếu không tạo được user."""
         uid = user_data['id']
         if uid in db['users']:
             current = db['users'][uid]
-            for field in ['name', 'email', 'major', 'faculty', 'phone', 'address']:
+            new_email = user_data.get('email')
+            if new_email and new_email != current.get('email'):
+                try:
+                    update_user_email(uid, new_email)
+                except ValueError:
+                    print(f"[UserRepo] Email {new_email} đã thuộc user khác, bỏ qua")
+            for field in ['name', 'major', 'faculty', 'phone', 'address']:
                 if user_data.get(field) and user_data.get(field) != current.get(field):
                     current[field] = user_data.get(field)
+            mark_dirty('users', uid)
             print(f"[UserRepo] Đã cập nhật user {uid}")
+            return "updated"
         else:
             from core.database import create_user
             try:
                 create_user(**user_data, password="default_password")
                 print(f"[UserRepo] Đã tạo user mới {uid}")
-            except ValueError: pass
+                return "created"
+            except ValueError:
+                return None
             
+    def bulk_create_sso_users(self, records: List[dict]):
+        """Tạo hàng loạt user chỉ đăng nhập qua SSO (không băm mật khẩu mặc định)."""
+        from core.database import bulk_create_users
+        return bulk_create_users(records)
+
     def get_user_by_id(self, user_id: str) -> Optional[dict]:
         return db['users'].get(user_id)
 
 class RoleRepository:
     def update_or_create(self, role_data: dict):
-        db['roles'][role_data['id']] = role_data
+        db.setdefault('roles', {})[role_data['id']] = role_data
+        mark_dirty('roles', role_data['id'])
         
+# Cấu hình lấy hồ sơ theo chunk
+SYNC_CHUNK_SIZE = int(os.environ.get("SYNC_CHUNK_SIZE", "500"))
+SYNC_FETCH_WORKERS = int(os.environ.get("SYNC_FETCH_WORKERS", "4"))
+SYNC_FETCH_RETRIES = int(os.environ.get("SYNC_FETCH_RETRIES", "3"))
+SYNC_BACKOFF_SECONDS = float(os.environ.get("SYNC_BACKOFF_SECONDS", "0.5"))
+
+# Lịch sử lượt đồng bộ (bảng `sync_runs`, có WAL): giữ tối đa N lượt mỗi loại
+SYNC_HISTORY_LIMIT = int(os.environ.get("SYNC_HISTORY_LIMIT", "200"))
+SYNC_HISTORY_ERROR_SAMPLES = 5
+
+
+def _ids_digest(user_ids: List[str]) -> str:
+    return hashlib.sha1("\n".join(user_ids).encode("utf-8")).hexdigest()
+
+
 # Services
 class DataSyncService:
     def __init__(self):
         self.datacore_client = MockDataCoreClient()
         self.userRepo = UserRepository()
         self.roleRepo = RoleRepository()
-        self._sync_history = {} 
+        self.chunk_size = max(1, SYNC_CHUNK_SIZE)
+        self.fetch_workers = max(1, SYNC_FETCH_WORKERS)
+        self.fetch_retries = max(1, SYNC_FETCH_RETRIES)
+        self.backoff_seconds = SYNC_BACKOFF_SECONDS
 
-    def run_scheduled_personal_data_sync(self) -> SyncReport:
+    def run_scheduled_personal_data_sync(self, job=None) -> SyncReport:
+        """`job` (tuỳ chọn, xem sync_jobs.SyncJob) nhận tiến độ và yêu cầu huỷ."""
         report = SyncReport(datetime.now(), SyncStatusEnum.SUCCESS, "Auto Sync Started")
+        started = time.perf_counter()
         try:
             # 1. Hỏi DataCore danh sách toàn bộ ID
             all_ids = self.datacore_client.fetch_all_user_ids()
+            report.phases['id_fetch'] = round((time.perf_counter() - started) * 1000, 1)
             print(f"[Sync] Tìm thấy {len(all_ids)} user trên hệ thống trường.")
             
-            # 2. Đồng bộ toàn bộ danh sách này (Tự tạo mới nếu chưa có)
-            self._core_pull_and_process_user_data(all_ids)
+            # 2. Đồng bộ toàn bộ danh sách này theo chunk (Tự tạo mới nếu chưa có,
+            #    bỏ qua hồ sơ có hash trùng lần đồng bộ trước và chunk đã xong
+            #    ở lần chạy bị gián đoạn)
+            failed, resumed = self._core_pull_and_process_user_data(all_ids, report,
+                                                                    checkpoint_key=SyncTypeEnum.PERSONAL.value,
+                                                                    job=job)
             
-            report.message = f"Đã đồng bộ toàn bộ {len(all_ids)} người dùng."
-            report.records_processed = len(all_ids)
-            self._update_sync_status(SyncTypeEnum.PERSONAL, report)
+            report.records_processed = report.created + report.updated + report.unchanged
+            self._finish_run(report, started)
+            report.message = (f"Đã đồng bộ {report.records_processed}/{len(all_ids)} người dùng: "
+                              f"{report.created} tạo mới, {report.updated} cập nhật, {report.unchanged} không đổi "
+                              f"({report.records_per_second:.0f} bản ghi/s).")
+            if resumed:
+                report.message += f" Tiếp tục từ checkpoint, bỏ qua {resumed} chunk đã xong."
+            if failed:
+                report.status = SyncStatusEnum.PARTIAL
+                report.message += f" {failed} chunk lỗi, sẽ thử lại ở lần chạy sau."
+        except SyncCancelled as e:
+            report.records_processed = report.created + report.updated + report.unchanged
+            report.status = SyncStatusEnum.CANCELLED; report.message = str(e)
+            self._finish_run(report, started)
         except Exception as e:
             report.status = SyncStatusEnum.FAILED; report.message = str(e)
-            self._update_sync_status(SyncTypeEnum.PERSONAL, report)
+            self._finish_run(report, started)
+        self._update_sync_status(SyncTypeEnum.PERSONAL, report)
         return report
 
     def run_manual_personal_data_sync(self, user_id: str) -> SyncReport:
@@ -177,73 +243,280 @@ class DataSyncService:
             status=SyncStatusEnum.SUCCESS,
             message=f"Đồng bộ thủ công cho user {user_id}"
         )
+        started = time.perf_counter()
         try:
-            self._core_pull_and_process_user_data([user_id])
+            # Đồng bộ thủ công luôn ghi đè, kể cả khi hash không đổi
+            self._core_pull_and_process_user_data([user_id], report, force=True)
             report.records_processed = 1
             report.message = "Đồng bộ thành công"
         except Exception as e:
             report.status = SyncStatusEnum.FAILED
             report.message = str(e)
             report.errors.append(str(e))
+        self._finish_run(report, started)
+        self._update_sync_status(SyncTypeEnum.PERSONAL, report, mode="MANUAL")
         
         return report
 
-    def run_scheduled_role_sync(self) -> SyncReport:
+    def run_scheduled_role_sync(self, job=None) -> SyncReport:
         report = SyncReport(
             timestamp=datetime.now(),
             status=SyncStatusEnum.SUCCESS,
             message="Đồng bộ Role bắt đầu"
         )
+        started = time.perf_counter()
         try:
-            self._core_pull_and_process_all_roles()
+            report.records_processed = self._core_pull_and_process_all_roles(report, job)
             report.message = "Đồng bộ thành công"
-            self._update_sync_status(SyncTypeEnum.ROLE, report)
+        except SyncCancelled as e:
+            report.status = SyncStatusEnum.CANCELLED
+            report.message = str(e)
         except Exception as e:
             report.status = SyncStatusEnum.FAILED
             report.message = str(e)
-            self._update_sync_status(SyncTypeEnum.ROLE, report)
+        self._finish_run(report, started)
+        self._update_sync_status(SyncTypeEnum.ROLE, report)
         
         return report
 
-    def _core_pull_and_process_user_data(self, user_ids: list[str]) -> None:
-        max_retries = 3
-        for attempt in range(max_retries):
+    def _core_pull_and_process_user_data(self, user_ids: list[str], report: Optional[SyncReport] = None,
+                                         force: bool = False, checkpoint_key: Optional[str] = None,
+                                         job=None):
+        """Lấy hồ sơ theo chunk `chunk_size` ID, song song trên tối đa `fetch_workers` luồng.
+
+        Mỗi chunk được thử lại với backoff luỹ thừa; chunk vẫn lỗi được ghi vào
+        `report.errors` thay vì làm hỏng cả lượt. Hồ sơ được ghi vào db trên
+        luồng gọi, theo thứ tự chunk hoàn thành. Nếu có `checkpoint_key`, các
+        chunk đã xong được lưu trong `db['sync_checkpoints']` để lượt sau (cùng
+        danh sách ID) bỏ qua; checkpoint bị xoá khi mọi chunk thành công.
+
+        Nếu có `job`, tiến độ được báo qua `job.set_total` / `job.advance` và
+        `job.cancelled` được kiểm tra giữa các chunk: khi bị huỷ, các chunk
+        chưa chạy bị bỏ, checkpoint được giữ và SyncCancelled được raise.
+
+        Trả về (số chunk lỗi, số chunk bỏ qua nhờ checkpoint). Raise
+        UserDataProcessingError khi không chunk nào lấy được.
+        """
+        report = report or SyncReport(datetime.now(), SyncStatusEnum.SUCCESS, "")
+        size = self.chunk_size
+        total_chunks = (len(user_ids) + size - 1) // size
+        ids_hash = _ids_digest(user_ids) if checkpoint_key else None
+        done = self._load_checkpoint(checkpoint_key, ids_hash) if checkpoint_key else set()
+        pending = (i for i in range(total_chunks) if i not in done)
+        resumed = len(done)
+        if job is not None:
+            job.set_total(len(user_ids))
+            job.advance(sum(len(user_ids[i * size:(i + 1) * size]) for i in done))
+
+        failed = 0
+        last_error = None
+        fetch_total = apply_total = 0.0
+        # Giới hạn số chunk đang bay để không giữ cả danh sách hồ sơ trong bộ nhớ
+        max_in_flight = self.fetch_workers * 2
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="sync-fetch") as pool:
+            in_flight = {}
+
+            def _submit_next() -> bool:
+                index = next(pending, None)
+                if index is None:
+                    return False
+                chunk = user_ids[index * size:(index + 1) * size]
+                try:
+                    in_flight[pool.submit(self._fetch_chunk, chunk)] = (index, chunk)
+                except RuntimeError as e:
+                    if not is_shutdown_error(e):
+                        raise
+                    # Tiến trình đang tắt: dừng như khi bị huỷ, checkpoint được giữ
+                    for future in in_flight:
+                        future.cancel()
+                    raise SyncCancelled("Dừng vì tiến trình đang tắt; lần chạy sau tiếp tục từ checkpoint")
+                return True
+
+            while len(in_flight) < max_in_flight and _submit_next():
+                pass
+            while in_flight:
+                if job is not None and job.cancelled:
+                    for future in in_flight:
+                        future.cancel()
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index, chunk = in_flight.pop(future)
+                    try:
+                        profiles, fetch_seconds = future.result()
+                    except Exception as e:
+                        failed += 1
+                        last_error = e
+                        report.errors.append(f"Chunk {index} ({chunk[0]}..{chunk[-1]}, {len(chunk)} user): {e}")
+                    else:
+                        fetch_total += fetch_seconds
+                        apply_started = time.perf_counter()
+                        self._apply_user_profiles(profiles, report, force)
+                        if checkpoint_key:
+                            done.add(index)
+                            self._save_checkpoint(checkpoint_key, ids_hash, len(user_ids), done)
+                        apply_total += time.perf_counter() - apply_started
+                    if job is not None:
+                        job.advance(len(chunk))
+                    _submit_next()
+
+        # profile_fetch cộng dồn thời gian của mọi luồng lấy hồ sơ (có thể lớn hơn thời gian thực)
+        report.phases['profile_fetch'] = round(fetch_total * 1000, 1)
+        report.phases['apply'] = round(apply_total * 1000, 1)
+        if job is not None and job.cancelled:
+            raise SyncCancelled(f"Đã huỷ sau {job.done}/{len(user_ids)} user; lần chạy sau tiếp tục từ checkpoint")
+
+        if failed and failed == total_chunks:
+            raise UserDataProcessingError(f"Thất bại sau {self.fetch_retries} lần thử: {last_error}")
+        if checkpoint_key and not failed:
+            self._clear_checkpoint(checkpoint_key)
+        return failed, resumed
+
+    def _fetch_chunk(self, chunk: List[str]):
+        """Trả về (danh sách hồ sơ, số giây của lần lấy thành công)."""
+        for attempt in range(self.fetch_retries):
             try:
-                data = self.datacore_client.fetch_user_profiles(user_ids)
-                for user_data in data:
-                    self.userRepo.update_or_create(user_data)
-                return
+                started = time.perf_counter()
+                profiles = self.datacore_client.fetch_user_profiles(chunk)
+                return profiles, time.perf_counter() - started
             except Exception as e:
-                print(f"[Sync] Lần thử {attempt+1} thất bại: {e}")
-                if attempt == max_retries - 1:
-                    raise UserDataProcessingError(f"Thất bại sau {max_retries} lần thử: {e}")
-                time.sleep(1)
+                if attempt == self.fetch_retries - 1:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                print(f"[Sync] Chunk {chunk[0]}.. lần thử {attempt+1} thất bại: {e}; thử lại sau {delay:.2f}s")
+                # Jitter nhỏ để các chunk lỗi cùng lúc không dội lại DataCore cùng lúc
+                time.sleep(delay * random.uniform(0.8, 1.2))
+
+    def _load_checkpoint(self, key: str, ids_hash: str) -> set:
+        cp = db.get('sync_checkpoints', {}).get(key)
+        if not cp or cp.get('ids_hash') != ids_hash or cp.get('chunk_size') != self.chunk_size:
+            return set()
+        print(f"[Sync] Tiếp tục lượt {key} từ checkpoint: {len(cp['done'])} chunk đã xong")
+        return set(cp['done'])
+
+    def _save_checkpoint(self, key: str, ids_hash: str, total: int, done: set) -> None:
+        db.setdefault('sync_checkpoints', {})[key] = {
+            "ids_hash": ids_hash,
+            "chunk_size": self.chunk_size,
+            "total": total,
+            "done": sorted(done),
+            "updated_at": datetime.now().isoformat(),
+        }
+        mark_dirty('sync_checkpoints', key)
+
+    def _clear_checkpoint(self, key: str) -> None:
+        if db.get('sync_checkpoints', {}).pop(key, None) is not None:
+            mark_dirty('sync_checkpoints', key)
+
+    def _apply_user_profiles(self, profiles: list, report: SyncReport, force: bool = False) -> None:
+        """Ghi một chunk hồ sơ: user mới đi đường tạo hàng loạt, user cũ cập nhật từng người."""
+        new_users, digests = [], {}
+        for user_data in profiles:
+            if user_data['id'] in db['users']:
+                self._apply_user_profile(user_data, report, force)
+            else:
+                new_users.append(user_data)
+                digests[user_data['id']] = profile_hash(user_data)
+        if not new_users:
+            return
+
+        created, rejected = self.userRepo.bulk_create_sso_users(new_users)
+        hashes = db.setdefault('sync_hashes', {})
+        for user in created:
+            hashes[user['id']] = digests[user['id']]
+            mark_dirty('sync_hashes', user['id'])
+        report.created += len(created)
+        for uid, reason in rejected:
+            report.errors.append(f"{uid}: không tạo được user ({reason})")
+
+    def _apply_user_profile(self, user_data: dict, report: SyncReport, force: bool = False) -> None:
+        """Ghi một hồ sơ vào db nếu nội dung đã đổi so với lần đồng bộ trước.
 
-    def _core_pull_and_process_all_roles(self) -> None:
+        `db['sync_hashes']` giữ hash hồ sơ DataCore đã áp dụng gần nhất cho mỗi
+        user (được ghi WAL như các bảng khác), nên lần chạy sau chỉ còn phải
+        băm và so sánh những hồ sơ không đổi.
+        """
+        uid = user_data['id']
+        digest = profile_hash(user_data)
+        hashes = db.setdefault('sync_hashes', {})
+        if not force and hashes.get(uid) == digest and uid in db['users']:
+            report.unchanged += 1
+            return
+
+        outcome = self.userRepo.update_or_create(user_data)
+        if outcome is None:
+            report.errors.append(f"{uid}: không tạo được user (email đã tồn tại?)")
+            return
+        hashes[uid] = digest
+        mark_dirty('sync_hashes', uid)
+        if outcome == "created":
+            report.created += 1
+        else:
+            report.updated += 1
+
+    def _core_pull_and_process_all_roles(self, report: Optional[SyncReport] = None, job=None) -> int:
         max_retries = 3
         for attempt in range(max_retries):
             try:
+                started = time.perf_counter()
                 roles_data = self.datacore_client.fetch_all_roles()
+                fetched = time.perf_counter()
+                if job is not None:
+                    job.set_total(len(roles_data))
+                    if job.cancelled:
+                        raise SyncCancelled("Đã huỷ trước khi ghi role")
                 for r_data in roles_data:
                     self.roleRepo.update_or_create(r_data)
-                return
+                    if job is not None:
+                        job.advance(1)
+                if report is not None:
+                    report.phases['fetch'] = round((fetched - started) * 1000, 1)
+                    report.phases['apply'] = round((time.perf_counter() - fetched) * 1000, 1)
+                return len(roles_data)
+            except SyncCancelled:
+                raise
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise RoleProcessingError(f"Không thể đồng bộ: {e}")
                 time.sleep(1)
 
     def get_latest_sync_status(self, sync_type: SyncTypeEnum) -> SyncStatus:
-        if sync_type in self._sync_history:
-            report = self._sync_history[sync_type]
+        runs = self.get_sync_history(sync_type, limit=1)
+        if runs:
+            run = runs[0]
             return SyncStatus(
-                last_run=report.timestamp,
-                status=report.status,
-                details=report.message
+                last_run=datetime.fromisoformat(run['timestamp']),
+                status=SyncStatusEnum(run['status']),
+                details=run['message']
             )
         return SyncStatus(datetime.now(), SyncStatusEnum.FAILED, "Chưa có lịch sử đồng bộ")
 
-    def _update_sync_status(self, type: SyncTypeEnum, report: SyncReport):
-        self._sync_history[type] = report
+    def get_sync_history(self, sync_type: SyncTypeEnum, limit: Optional[int] = None) -> List[dict]:
+        """Các lượt đồng bộ đã lưu của `sync_type`, mới nhất trước."""
+        runs = [r for r in list(db.get('sync_runs', {}).values()) if r['type'] == sync_type.value]
+        runs.sort(key=lambda r: r['timestamp'], reverse=True)
+        return runs[:limit] if limit is not None else runs
+
+    def _finish_run(self, report: SyncReport, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        report.finished_at = datetime.now()
+        report.duration_ms = round(elapsed * 1000, 1)
+        report.records_per_second = round(report.records_processed / elapsed, 1) if elapsed > 0 else None
+
+    def _update_sync_status(self, type: SyncTypeEnum, report: SyncReport, mode: str = "SCHEDULED"):
+        """Lưu lượt chạy vào `db['sync_runs']` và xoá các lượt cũ vượt SYNC_HISTORY_LIMIT."""
+        run = report.to_dict()
+        run_id = uuid.uuid4().hex[:12]
+        run.update(id=run_id, type=type.value, mode=mode,
+                   error_count=len(report.errors),
+                   errors=report.errors[:SYNC_HISTORY_ERROR_SAMPLES])
+        runs = db.setdefault('sync_runs', {})
+        runs[run_id] = run
+        mark_dirty('sync_runs', run_id)
+
+        for old in self.get_sync_history(type)[SYNC_HISTORY_LIMIT:]:
+            runs.pop(old['id'], None)
+            mark_dirty('sync_runs', old['id'])
 
 class AuthService:
     def __init__(self):
@@ -348,7 +621,8 @@ class SchedulerService:
             day_value=cfg.get('day_value', "*"),
             is_active=cfg['is_active'],
             last_run=cfg.get('last_run'),
-            next_run=next_run
+            next_run=next_run,
+            last_duration_ms=cfg.get('last_duration_ms')
         )
 
     def update_config(self, new_config: dict):
@@ -356,6 +630,7 @@ class SchedulerService:
         for key in ['schedule_type', 'interval_minutes', 'run_time', 'day_value']:
             if key in new_config:
                 current[key] = new_config[key]
+        mark_dirty('scheduler_config', 'main')
         
         if current['is_active']:
             self.start_scheduler()
@@ -418,24 +693,58 @@ class SchedulerService:
             print(f"[Scheduler] 🟢 Đã BẬT: Chạy ngày {day_val} hàng tháng lúc {time_str}.")
 
         cfg['is_active'] = True
+        mark_dirty('scheduler_config', 'main')
 
     def stop_scheduler(self):
         if scheduler.get_job(self.JOB_ID):
             scheduler.remove_job(self.JOB_ID)
         db['scheduler_config']['main']['is_active'] = False
+        mark_dirty('scheduler_config', 'main')
         print("[Scheduler] 🔴 Đã TẮT đồng bộ tự động.")
 
+def _job_app():
+    """Flask app for scheduled jobs: the one the scheduler was started with.
+
+    Falls back to a bare app (config only - no seeding, no blueprints) when the
+    job is invoked outside `create_app`, e.g. from a shell.
+    """
+    app = getattr(scheduler, 'app', None)
+    if app is None:
+        from flask import Flask
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret')
+    return app
+
+
 def run_auto_sync_job():
     print("\n[Scheduler] ⏰ Bắt đầu chạy Job đồng bộ tự động...")
-    from app import create_app
-    app = create_app(init_scheduler=False)
-
-    with app.app_context():
-        service = DataSyncService()
-        report = service.run_scheduled_personal_data_sync()
-        if 'scheduler_config' in db and 'main' in db['scheduler_config']:
-            db['scheduler_config']['main']['last_run'] = datetime.now().isoformat()
-            
-        print(f"[Scheduler] Kết quả: {report.status.value} - {report.message}\n")
-        
-        
\ No newline at end of file
+    # Reuse the running app and the shared service (and its sync history)
+    # instead of create_app(), which would reseed and overwrite `db`.
+    from modules.integration.data_sync_routes import sync_service
+    from modules.integration.sync_jobs import get_sync_jobs, DuplicateSyncJob
+
+    app = _job_app()
+
+    def _scheduled_run(job):
+        started = time.perf_counter()
+        with app.app_context():
+            report = sync_service.run_scheduled_personal_data_sync(job)
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            if 'scheduler_config' in db and 'main' in db['scheduler_config']:
+                db['scheduler_config']['main']['last_run'] = datetime.now().isoformat()
+                db['scheduler_config']['main']['last_duration_ms'] = duration_ms
+                mark_dirty('scheduler_config', 'main')
+
+            print(f"[Scheduler] Kết quả: {report.status.value} - {report.message} ({duration_ms} ms)\n")
+        return report
+
+    # Đi qua cùng hàng đợi với trigger thủ công để chỉ một lượt PERSONAL chạy tại một thời điểm
+    try:
+        job = get_sync_jobs().submit(SyncTypeEnum.PERSONAL.value, _scheduled_run)
+    except DuplicateSyncJob as e:
+        print(f"[Scheduler] Bỏ qua: job đồng bộ {e.job.id} đang chạy")
+        return None
+    except RuntimeError as e:
+        print(f"[Scheduler] Bỏ qua: {e}")
+        return None
+    return job
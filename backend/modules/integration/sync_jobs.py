@@ -0,0 +1,212 @@
+# backend/modules/integration/sync_jobs.py
+"""Background jobs for the `/sync` endpoints.
+
+A full sync can take minutes; running it inside the HTTP request keeps the
+admin's browser waiting and a Flask worker busy. Jobs here run on a small
+thread pool instead: the trigger returns a job id at once, the job reports
+records done / total as chunks are applied, and a cancel request is noticed
+between chunks (the sync checkpoint lets the next run pick up from there).
+Only one job per sync type may be queued or running at a time.
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional
+
+
+class DuplicateSyncJob(Exception):
+    """Raised when a job of the same type is already queued or running."""
+    def __init__(self, job: "SyncJob"):
+        super().__init__(f"Đã có job đồng bộ {job.kind} đang chạy ({job.id})")
+        self.job = job
+
+
+class SyncJob:
+    ACTIVE = ("QUEUED", "RUNNING")
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        # QUEUED -> RUNNING -> SUCCESS / PARTIAL / FAILED / CANCELLED
+        self.status = "QUEUED"
+        self.total: Optional[int] = None
+        self.done = 0
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.status in self.ACTIVE
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def request_cancel(self) -> None:
+        self._cancel.set()
+
+    # Progress hooks called by DataSyncService
+    def set_total(self, total: int) -> None:
+        with self._lock:
+            self.total = total
+
+    def advance(self, count: int) -> None:
+        with self._lock:
+            self.done += count
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            done, total = self.done, self.total
+        return {
+            "id": self.id,
+            "type": self.kind,
+            "status": self.status,
+            "done": done,
+            "total": total,
+            "progress": round(done / total, 4) if total else None,
+            "cancel_requested": self.cancelled,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class SyncJobQueue:
+    def __init__(self, workers: int = 2, keep: int = 50):
+        self.workers = workers
+        self.keep = keep
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sync-job")
+        return self._executor
+
+    def submit(self, kind: str, fn: Callable[[SyncJob], object]) -> SyncJob:
+        """Queue `fn(job)`, which must return a SyncReport. Raises DuplicateSyncJob."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Hàng đợi job đồng bộ đã dừng")
+            running = self._active_locked(kind)
+            if running is not None:
+                raise DuplicateSyncJob(running)
+            job = SyncJob(kind)
+            self._jobs[job.id] = job
+            self._prune_locked()
+            self._get_executor().submit(self._run, job, fn)
+        print(f"[SyncJobs] Đã xếp hàng job {job.kind} {job.id}")
+        return job
+
+    def _run(self, job: SyncJob, fn) -> None:
+        with self._lock:
+            # cancel() / shutdown() đổi trạng thái dưới cùng khoá, nên không thể
+            # vừa bị huỷ vừa chuyển sang RUNNING
+            if job.cancelled:
+                job.status = "CANCELLED"
+                job.finished_at = job.finished_at or datetime.now()
+                return
+            job.started_at = datetime.now()
+            job.status = "RUNNING"
+        result = error = None
+        try:
+            report = fn(job)
+            result, status = report.to_dict(), report.status.value
+        except Exception as e:
+            error = str(e)
+            # Tiến trình đang tắt giữa chừng: coi như bị huỷ, checkpoint vẫn còn
+            status = "CANCELLED" if is_shutdown_error(e) else "FAILED"
+        with self._lock:
+            job.result, job.error, job.status = result, error, status
+            job.finished_at = datetime.now()
+        print(f"[SyncJobs] Job {job.kind} {job.id} kết thúc: {job.status} ({job.done}/{job.total})")
+
+    def _active_locked(self, kind: str) -> Optional[SyncJob]:
+        for job in self._jobs.values():
+            if job.kind == kind and job.active:
+                return job
+        return None
+
+    def _prune_locked(self) -> None:
+        # Giữ tối đa `keep` job; chỉ bỏ các job đã kết thúc, cũ nhất trước
+        excess = len(self._jobs) - self.keep
+        for job_id in [j.id for j in self._jobs.values() if not j.active][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def active(self, kind: str) -> Optional[SyncJob]:
+        with self._lock:
+            return self._active_locked(kind)
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[SyncJob]:
+        """Jobs newest first."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in reversed(jobs) if kind is None or j.kind == kind]
+
+    def cancel(self, job_id: str) -> Optional[SyncJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return job
+            job.request_cancel()
+            if job.status == "QUEUED":
+                # Chưa chạy: kết thúc luôn, worker sẽ bỏ qua khi tới lượt
+                job.status = "CANCELLED"
+                job.finished_at = datetime.now()
+        return job
+
+    def shutdown(self) -> None:
+        """Stop accepting jobs, ask running ones to stop and wait for them.
+
+        Called by `create_app`'s exit hook and after `app.run` returns. A job
+        still running when concurrent.futures refuses new work at interpreter
+        exit ends CANCELLED too (see `is_shutdown_error`).
+        """
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+            for job in self._jobs.values():
+                if job.active:
+                    job.request_cancel()
+                if job.status == "QUEUED":
+                    job.status = "CANCELLED"
+                    job.finished_at = datetime.now()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def is_shutdown_error(e: BaseException) -> bool:
+    """RuntimeError của concurrent.futures khi interpreter đã bắt đầu tắt."""
+    return isinstance(e, RuntimeError) and "cannot schedule new futures" in str(e)
+
+
+_queue: Optional[SyncJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_sync_jobs() -> SyncJobQueue:
+    """Process-wide queue; SYNC_JOB_WORKERS (default 2) threads, SYNC_JOB_KEEP (50) jobs remembered."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SyncJobQueue(
+                workers=max(1, int(os.environ.get("SYNC_JOB_WORKERS", "2"))),
+                keep=max(1, int(os.environ.get("SYNC_JOB_KEEP", "50"))),
+            )
+        return _queue
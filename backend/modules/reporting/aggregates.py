@@ -0,0 +1,158 @@
+"""Incrementally maintained appointment aggregates per tutor, course and week.
+
+Every appointment contributes a small counter vector (sessions, cancellations,
+booked seats, capacity, attendance from `report`, ratings) to one bucket in
+each dimension. The contribution last applied is remembered per appointment,
+so when `mark_dirty("appointments", id)` reports a booking, unbooking,
+cancellation, reschedule or new feedback, the old vector is subtracted and
+the new one added. Reading a bucket never rescans `db["appointments"]`.
+"""
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from core.database import db, register_change_listener, register_rebuild_hook
+from core.models import STATUS_CANCELLED
+
+DIMENSIONS = ("tutor", "course", "week")
+
+# Counter order inside a contribution vector
+COUNTERS = ("sessions", "cancelled", "booked", "capacity",
+            "present", "report_capacity", "rating_sum", "rating_count")
+
+_EPOCH = datetime(1970, 1, 1)
+_SESSION_SUFFIX_RE = re.compile(r"\s*\(Buổi\s*\d+\)\s*$", re.IGNORECASE)
+
+
+def course_key(apt) -> str:
+    """`course_code` when the session carries one, else its name minus '(Buổi N)'."""
+    code = (apt.extra or {}).get("course_code")
+    if code:
+        return str(code).upper()
+    return _SESSION_SUFFIX_RE.sub("", apt.name or "") or "UNKNOWN"
+
+
+def week_key(ts: int) -> str:
+    year, week, _ = (_EPOCH + timedelta(seconds=ts)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _contribution(apt) -> Tuple[Tuple[str, str, str], Tuple[int, ...]]:
+    cancelled = apt.status == STATUS_CANCELLED
+    report = apt.report or {}
+    ratings = [fb.get("rating") for fb in (apt.feedback or ()) if isinstance(fb.get("rating"), (int, float))]
+    if cancelled:
+        vector = (0, 1, 0, 0, 0, 0, sum(ratings), len(ratings))
+    else:
+        vector = (
+            1, 0, len(apt.roster), apt.max_slot,
+            int(report.get("present") or 0), int(report.get("capacity") or 0),
+            sum(ratings), len(ratings),
+        )
+    return (apt.tutor_id, course_key(apt), week_key(apt.start)), vector
+
+
+def _summary(counters: Optional[List[int]]) -> dict:
+    c = dict(zip(COUNTERS, counters or [0] * len(COUNTERS)))
+    return {
+        "sessions": c["sessions"],
+        "cancelled": c["cancelled"],
+        "booked": c["booked"],
+        "capacity": c["capacity"],
+        "fill_ratio": round(c["booked"] / c["capacity"], 4) if c["capacity"] else None,
+        "attendance_rate": round(c["present"] / c["report_capacity"], 4) if c["report_capacity"] else None,
+        "avg_rating": round(c["rating_sum"] / c["rating_count"], 2) if c["rating_count"] else None,
+        "rating_count": c["rating_count"],
+    }
+
+
+class AppointmentAggregates:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, List[int]]] = {d: {} for d in DIMENSIONS}
+        self._applied: Dict[str, tuple] = {}   # apt_id -> (keys, vector) last added
+
+    def _apply_locked(self, keys, vector, sign: int) -> None:
+        for dim, key in zip(DIMENSIONS, keys):
+            bucket = self._buckets[dim].get(key)
+            if bucket is None:
+                bucket = self._buckets[dim][key] = [0] * len(COUNTERS)
+            for i, v in enumerate(vector):
+                bucket[i] += sign * v
+            if not any(bucket):
+                del self._buckets[dim][key]
+
+    def update(self, apt_id: str, apt) -> None:
+        """Replace the contribution of `apt_id` (remove it when `apt` is None)."""
+        new = _contribution(apt) if apt is not None else None
+        with self._lock:
+            old = self._applied.pop(apt_id, None)
+            if old is not None:
+                self._apply_locked(old[0], old[1], -1)
+            if new is not None:
+                self._apply_locked(new[0], new[1], 1)
+                self._applied[apt_id] = new
+
+    def rebuild(self, appointments) -> None:
+        fresh = AppointmentAggregates()
+        for apt_id, apt in list(appointments.items()):
+            fresh.update(apt_id, apt)
+        with self._lock:
+            self._buckets = fresh._buckets
+            self._applied = fresh._applied
+
+    def get(self, dimension: str, key: str) -> dict:
+        with self._lock:
+            counters = self._buckets[dimension].get(key)
+            return _summary(list(counters) if counters else None)
+
+    def all(self, dimension: str) -> Dict[str, dict]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._buckets[dimension].items()]
+        return {k: _summary(v) for k, v in sorted(items)}
+
+    def raw(self) -> Dict[str, Dict[str, List[int]]]:
+        with self._lock:
+            return {d: {k: list(v) for k, v in b.items()} for d, b in self._buckets.items()}
+
+
+aggregates = AppointmentAggregates()
+
+
+@register_change_listener
+def _on_db_change(table, key, value):
+    if table == "appointments":
+        aggregates.update(key, value)
+
+
+@register_rebuild_hook
+def rebuild_aggregates() -> None:
+    aggregates.rebuild(db.get("appointments", {}))
+
+
+def verify_and_rebuild() -> dict:
+    """Recompute everything from `db`, report buckets that drifted, then swap in the recomputation."""
+    expected = AppointmentAggregates()
+    expected.rebuild(db.get("appointments", {}))
+    current, fresh = aggregates.raw(), expected.raw()
+
+    mismatches = []
+    for dim in DIMENSIONS:
+        for key in sorted(set(current[dim]) | set(fresh[dim])):
+            have, want = current[dim].get(key), fresh[dim].get(key)
+            if have != want:
+                mismatches.append({
+                    "dimension": dim,
+                    "key": key,
+                    "incremental": dict(zip(COUNTERS, have)) if have else None,
+                    "recomputed": dict(zip(COUNTERS, want)) if want else None,
+                })
+
+    aggregates.rebuild(db.get("appointments", {}))
+    return {
+        "ok": not mismatches,
+        "appointments": len(db.get("appointments", {})),
+        "buckets": {d: len(fresh[d]) for d in DIMENSIONS},
+        "mismatches": mismatches,
+    }
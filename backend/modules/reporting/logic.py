@@ -0,0 +1,223 @@
+"""Streaming exports for the reporting module.
+
+Each dataset is a generator of flat row dicts read straight from the
+in-memory `db`; `stream_rows` serializes them to CSV or NDJSON and yields
+chunks of roughly `CHUNK_SIZE` bytes. Nothing holds the whole export in
+memory, so a large export costs only the buffer of the chunk being built.
+"""
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from core.database import db
+from core.models import epoch_seconds, format_epoch
+
+CHUNK_SIZE = 64 * 1024
+# Hard cap per request so a semester-wide export cannot tie up a worker
+MAX_ROWS = int(os.environ.get("REPORT_EXPORT_MAX_ROWS", "100000"))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class ReportError(Exception):
+    """Raised when export parameters are invalid."""
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def parse_bound(value: Optional[str], name: str, end_of_day: bool = False) -> Optional[int]:
+    """'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' -> epoch seconds (None if absent)."""
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            dt = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end_of_day:
+            dt = dt.replace(hour=23, minute=59, second=59)
+        return epoch_seconds(dt)
+    raise ReportError(f"{name} sai định dạng (YYYY-MM-DD hoặc YYYY-MM-DD HH:MM:SS)")
+
+
+def parse_limit(value: Optional[str]) -> int:
+    if value is None:
+        return MAX_ROWS
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ReportError("limit phải là số nguyên")
+    if not 1 <= limit <= MAX_ROWS:
+        raise ReportError(f"limit phải trong khoảng 1..{MAX_ROWS}")
+    return limit
+
+
+def _in_window(ts: Optional[int], since: Optional[int], until: Optional[int]) -> bool:
+    if since is None and until is None:
+        return True
+    if ts is None:
+        return False
+    return (since is None or ts >= since) and (until is None or ts <= until)
+
+
+def _text_epoch(value: str) -> Optional[int]:
+    # Feedback uses ISO 'YYYY-MM-DDTHH:MM:SS.ffffffZ', access logs 'YYYY-MM-DD HH:MM:SS'
+    if not value:
+        return None
+    try:
+        return epoch_seconds(datetime.fromisoformat(value.rstrip("Z")).replace(tzinfo=None))
+    except ValueError:
+        return None
+
+
+def _iter_table(name: str) -> Iterator:
+    # Copy only the keys, so concurrent inserts cannot break the iteration
+    table = db.get(name, {})
+    for key in list(table):
+        value = table.get(key)
+        if value is not None:
+            yield value
+
+
+def _user_name(user_id: str) -> str:
+    user = db.get("users", {}).get(user_id)
+    return user.get("name", "") if user else ""
+
+
+# --- datasets ---
+
+def appointment_rows(since=None, until=None) -> Iterator[dict]:
+    for apt in _iter_table("appointments"):
+        if not _in_window(apt.start, since, until):
+            continue
+        yield {
+            "id": apt.id,
+            "name": apt.name,
+            "tutor_id": apt.tutor_id,
+            "tutor_name": _user_name(apt.tutor_id),
+            "start_time": format_epoch(apt.start),
+            "end_time": format_epoch(apt.end),
+            "place": apt.place,
+            "status": apt.status,
+            "max_slot": apt.max_slot,
+            "booked": len(apt.roster),
+        }
+
+
+def roster_rows(since=None, until=None) -> Iterator[dict]:
+    users = db.get("users", {})
+    for apt in _iter_table("appointments"):
+        if not _in_window(apt.start, since, until):
+            continue
+        for student_id in list(apt.roster):
+            student = users.get(student_id) or {}
+            yield {
+                "appointment_id": apt.id,
+                "appointment_name": apt.name,
+                "start_time": format_epoch(apt.start),
+                "tutor_id": apt.tutor_id,
+                "student_id": student_id,
+                "student_name": student.get("name", ""),
+                "student_email": student.get("email", ""),
+            }
+
+
+def feedback_rows(since=None, until=None) -> Iterator[dict]:
+    for apt in _iter_table("appointments"):
+        for fb in list(apt.feedback or ()):
+            created_at = fb.get("created_at", "")
+            if not _in_window(_text_epoch(created_at), since, until):
+                continue
+            student_id = fb.get("student_id")
+            yield {
+                "appointment_id": apt.id,
+                "appointment_name": apt.name,
+                "tutor_id": apt.tutor_id,
+                "student_id": student_id,
+                "student_name": _user_name(student_id),
+                "rating": fb.get("rating"),
+                "comment": fb.get("comment", ""),
+                "created_at": created_at,
+            }
+
+
+def access_log_rows(since=None, until=None) -> Iterator[dict]:
+    for log in _iter_table("access_logs"):
+        if not _in_window(_text_epoch(log.get("timestamp")), since, until):
+            continue
+        yield {
+            "id": log.get("id"),
+            "user_id": log.get("user_id"),
+            "doc_id": log.get("doc_id"),
+            "action": log.get("action"),
+            "timestamp": log.get("timestamp"),
+            "partner_id": log.get("partner_id", ""),
+        }
+
+
+# dataset name -> (row generator, CSV columns)
+DATASETS: Dict[str, tuple] = {
+    "appointments": (appointment_rows, ["id", "name", "tutor_id", "tutor_name", "start_time",
+                                        "end_time", "place", "status", "max_slot", "booked"]),
+    "rosters": (roster_rows, ["appointment_id", "appointment_name", "start_time", "tutor_id",
+                              "student_id", "student_name", "student_email"]),
+    "feedback": (feedback_rows, ["appointment_id", "appointment_name", "tutor_id", "student_id",
+                                 "student_name", "rating", "comment", "created_at"]),
+    "access_logs": (access_log_rows, ["id", "user_id", "doc_id", "action", "timestamp",
+                                      "partner_id"]),
+}
+
+
+def get_dataset(name: str) -> tuple:
+    if name not in DATASETS:
+        raise ReportError(f"dataset phải là một trong: {', '.join(sorted(DATASETS))}", 404)
+    return DATASETS[name]
+
+
+def check_format(fmt: str) -> str:
+    """Return the response mimetype for `fmt`."""
+    if fmt not in FORMATS:
+        raise ReportError(f"format phải là một trong: {', '.join(FORMATS)}")
+    return FORMATS[fmt]
+
+
+def stream_rows(rows: Iterator[dict], columns: List[str], fmt: str, limit: int,
+                on_done: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+    """Serialize at most `limit` rows as CSV/NDJSON, yielding ~CHUNK_SIZE pieces.
+
+    `fmt` must already be validated with `check_format`.
+    """
+    buf = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+
+    count = 0
+    try:
+        for row in rows:
+            if count >= limit:
+                break
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                buf.write(json.dumps(row, ensure_ascii=False, default=str))
+                buf.write("\n")
+            count += 1
+            if buf.tell() >= CHUNK_SIZE:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        if on_done is not None:
+            on_done(count)
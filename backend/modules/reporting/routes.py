@@ -0,0 +1,93 @@
+from datetime import datetime
+import time
+
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
+from core.security import require_role
+from .logic import (
+    get_dataset,
+    check_format,
+    parse_bound,
+    parse_limit,
+    stream_rows,
+    ReportError,
+)
+from .aggregates import aggregates, verify_and_rebuild, DIMENSIONS
+
+bp = Blueprint("reports", __name__, url_prefix="/reports")
+
+EXPORT_ROLES = {"OFFICER", "DEPARTMENT", "UNIVERSITY_OFFICER", "ADMIN"}
+
+
+@bp.route("/export/<dataset>", methods=["GET"])
+@require_role(EXPORT_ROLES)
+def export_dataset(dataset):
+    """
+    Xuất dữ liệu dạng stream (CSV hoặc NDJSON), không dựng toàn bộ file trong bộ nhớ.
+    dataset: appointments | rosters | feedback | access_logs
+    Query: format=csv|ndjson (mặc định csv), from/to (YYYY-MM-DD[ HH:MM:SS]), limit.
+    """
+
+    fmt = request.args.get("format", "csv").lower()
+    try:
+        row_fn, columns = get_dataset(dataset)
+        mimetype = check_format(fmt)
+        since = parse_bound(request.args.get("from"), "from")
+        until = parse_bound(request.args.get("to"), "to", end_of_day=True)
+        limit = parse_limit(request.args.get("limit"))
+    except ReportError as e:
+        return jsonify({"error": e.message}), e.status_code
+    if since is not None and until is not None and since > until:
+        return jsonify({"error": "from phải trước to"}), 400
+
+    user_id = g.user_id
+    started = time.perf_counter()
+
+    def _log_done(count):
+        print(f"[Report] {user_id} xuất {dataset} ({fmt}): {count} dòng trong "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    body = stream_rows(row_fn(since, until), columns, fmt, limit, on_done=_log_done)
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Row-Limit": str(limit),
+        },
+    )
+
+
+@bp.route("/aggregates/<dimension>", methods=["GET"])
+@require_role(EXPORT_ROLES)
+def list_aggregates(dimension):
+    """
+    Thống kê theo tutor / course / week: số buổi, số buổi huỷ, tỉ lệ lấp đầy,
+    tỉ lệ tham dự (từ report), điểm đánh giá trung bình.
+    """
+    if dimension not in DIMENSIONS:
+        return jsonify({"error": f"dimension phải là một trong: {', '.join(DIMENSIONS)}"}), 404
+
+    items = aggregates.all(dimension)
+    return jsonify({"dimension": dimension, "count": len(items), "items": items}), 200
+
+
+@bp.route("/aggregates/<dimension>/<path:key>", methods=["GET"])
+@require_role(EXPORT_ROLES)
+def get_aggregate(dimension, key):
+    if dimension not in DIMENSIONS:
+        return jsonify({"error": f"dimension phải là một trong: {', '.join(DIMENSIONS)}"}), 404
+
+    return jsonify({"dimension": dimension, "key": key, **aggregates.get(dimension, key)}), 200
+
+
+@bp.route("/aggregates/verify", methods=["POST"])
+@require_role("ADMIN")
+def verify_aggregates():
+    """Tính lại toàn bộ thống kê từ db, trả về các bucket bị lệch rồi thay bằng kết quả mới."""
+    started = time.perf_counter()
+    result = verify_and_rebuild()
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    if not result["ok"]:
+        print(f"[Report] Thống kê lệch {len(result['mismatches'])} bucket, đã tính lại")
+    return jsonify(result), 200
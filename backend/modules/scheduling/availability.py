@@ -0,0 +1,126 @@
+"""Bitmap store for tutors' weekly free schedules.
+
+A week grid is DAYS x PERIODS cells; the frontend names a cell
+"<day>-<period>" (day 0 = Monday, period 1..15). Each tutor-week is kept as
+one fixed-width integer bitset with bit ``day * PERIODS + period - 1`` set
+when the tutor is free. For "who is free" queries every week also keeps,
+per cell, a bitmap over tutor ordinals, so a slot range is answered by
+AND-ing one integer per cell instead of decoding every tutor's week.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional
+
+DAYS = 7
+PERIODS = 15
+WIDTH = DAYS * PERIODS
+FULL_MASK = (1 << WIDTH) - 1
+
+
+def cell_bit(day: int, period: int) -> int:
+	if not (0 <= day < DAYS and 1 <= period <= PERIODS):
+		raise ValueError(f"Ô lịch không hợp lệ: {day}-{period}")
+	return day * PERIODS + period - 1
+
+
+def cells_to_bits(cells: Iterable[str]) -> int:
+	"""["0-1", "2-5", ...] -> bitset; raises ValueError on malformed cells."""
+	bits = 0
+	for cell in cells:
+		try:
+			day, period = (int(x) for x in str(cell).split("-"))
+		except ValueError:
+			raise ValueError(f"Ô lịch không hợp lệ: {cell}")
+		bits |= 1 << cell_bit(day, period)
+	return bits
+
+
+def bits_to_cells(bits: int) -> List[str]:
+	cells = []
+	while bits:
+		low = bits & -bits
+		pos = low.bit_length() - 1
+		cells.append(f"{pos // PERIODS}-{pos % PERIODS + 1}")
+		bits ^= low
+	return cells
+
+
+def range_mask(day: int, period_from: int, period_to: Optional[int] = None) -> int:
+	"""Bits of `day` from `period_from` to `period_to` (inclusive)."""
+	period_to = period_from if period_to is None else period_to
+	if period_to < period_from:
+		raise ValueError("period_end phải >= period")
+	first, last = cell_bit(day, period_from), cell_bit(day, period_to)
+	return ((1 << (last - first + 1)) - 1) << first
+
+
+class AvailabilityStore:
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._weeks: Dict[str, Dict[str, int]] = {}          # week -> tutor_id -> bits
+		self._cell_tutors: Dict[str, List[int]] = {}         # week -> [tutor-ordinal bitmap per cell]
+		self._ordinal: Dict[str, int] = {}                   # tutor_id -> ordinal
+		self._tutors: List[str] = []                         # ordinal -> tutor_id
+
+	def clear(self) -> None:
+		with self._lock:
+			self._weeks.clear()
+			self._cell_tutors.clear()
+			self._ordinal.clear()
+			self._tutors.clear()
+
+	def _ordinal_of(self, tutor_id: str) -> int:
+		ordinal = self._ordinal.get(tutor_id)
+		if ordinal is None:
+			ordinal = self._ordinal[tutor_id] = len(self._tutors)
+			self._tutors.append(tutor_id)
+		return ordinal
+
+	def set(self, tutor_id: str, week: str, bits: int) -> None:
+		bits &= FULL_MASK
+		with self._lock:
+			tutors = self._weeks.setdefault(week, {})
+			cells = self._cell_tutors.setdefault(week, [0] * WIDTH)
+			tutor_bit = 1 << self._ordinal_of(tutor_id)
+			changed = tutors.get(tutor_id, 0) ^ bits
+			# Only the cells that flipped touch the per-cell bitmaps
+			while changed:
+				low = changed & -changed
+				pos = low.bit_length() - 1
+				cells[pos] ^= tutor_bit
+				changed ^= low
+			if bits:
+				tutors[tutor_id] = bits
+			else:
+				tutors.pop(tutor_id, None)
+
+	def get(self, tutor_id: str, week: str) -> int:
+		return self._weeks.get(week, {}).get(tutor_id, 0)
+
+	def who_is_free(self, week: str, mask: int) -> List[str]:
+		"""Tutors free in every cell of `mask`, in first-seen order."""
+		with self._lock:
+			cells = self._cell_tutors.get(week)
+			if not cells or not mask:
+				return []
+			free = -1
+			while mask and free:
+				low = mask & -mask
+				free &= cells[low.bit_length() - 1]
+				mask ^= low
+			tutors = []
+			while free > 0:
+				low = free & -free
+				tutors.append(self._tutors[low.bit_length() - 1])
+				free ^= low
+			return tutors
+
+	def common_free(self, week: str, tutor_ids: Iterable[str]) -> int:
+		"""Cells where every tutor in `tutor_ids` is free."""
+		with self._lock:
+			week_bits = self._weeks.get(week, {})
+			common = FULL_MASK
+			for tutor_id in tutor_ids:
+				common &= week_bits.get(tutor_id, 0)
+				if not common:
+					break
+			return common
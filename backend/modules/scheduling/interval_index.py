@@ -0,0 +1,126 @@
+"""Sorted per-key interval lists used for overlap checks.
+
+Each key (a tutor id, a student id, ...) owns a list of half-open intervals
+``[start, end)`` on integer timestamps, kept sorted by start. Looking for a
+conflict is a bisect plus a short backwards walk bounded by the longest
+interval stored under that key, so its cost depends on one person's calendar
+rather than on every appointment in the system.
+"""
+import heapq
+from bisect import bisect_left
+from typing import Container, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class IntervalIndex:
+	def __init__(self):
+		self._starts: Dict[Hashable, List[int]] = {}
+		self._entries: Dict[Hashable, List[Tuple[int, int, str]]] = {}
+		self._max_len: Dict[Hashable, int] = {}
+		self._where: Dict[Tuple[Hashable, str], Tuple[int, int]] = {}
+
+	def clear(self) -> None:
+		self._starts.clear()
+		self._entries.clear()
+		self._max_len.clear()
+		self._where.clear()
+
+	def add(self, key: Hashable, item_id: str, start: int, end: int) -> None:
+		"""Insert (or move) `item_id` under `key`."""
+		if (key, item_id) in self._where:
+			self.remove(key, item_id)
+		starts = self._starts.setdefault(key, [])
+		entries = self._entries.setdefault(key, [])
+		pos = bisect_left(starts, start)
+		starts.insert(pos, start)
+		entries.insert(pos, (start, end, item_id))
+		if end - start > self._max_len.get(key, 0):
+			self._max_len[key] = end - start
+		self._where[(key, item_id)] = (start, end)
+
+	def remove(self, key: Hashable, item_id: str) -> bool:
+		span = self._where.pop((key, item_id), None)
+		if span is None:
+			return False
+		starts = self._starts[key]
+		entries = self._entries[key]
+		pos = bisect_left(starts, span[0])
+		while pos < len(entries) and entries[pos][2] != item_id:
+			pos += 1
+		del starts[pos]
+		del entries[pos]
+		if not entries:
+			del self._starts[key]
+			del self._entries[key]
+			self._max_len.pop(key, None)
+		return True
+
+	def find_conflict(self, key: Hashable, start: int, end: int, exclude: Optional[str] = None) -> Optional[str]:
+		"""Return the id of an interval under `key` overlapping [start, end), if any."""
+		entries = self._entries.get(key)
+		if not entries:
+			return None
+		starts = self._starts[key]
+		lowest_start = start - self._max_len.get(key, 0)
+		# Only intervals starting before `end` can overlap; walk back until
+		# no stored interval could still reach past `start`.
+		pos = bisect_left(starts, end) - 1
+		while pos >= 0 and entries[pos][0] >= lowest_start:
+			s, e, item_id = entries[pos]
+			if e > start and item_id != exclude:
+				return item_id
+			pos -= 1
+		return None
+
+	def find_conflicts(self, key: Hashable, spans: Sequence[Tuple[int, int]],
+	                   exclude: Container[str] = ()) -> List[Tuple[int, str]]:
+		"""Check many spans (sorted by start and by end) in one sweep over `key`'s intervals.
+
+		Returns (span position, conflicting item id) for every span that
+		overlaps a stored interval. Stored intervals are pushed onto a heap
+		by end time as the sweep passes their start and dropped once they end
+		before the current span starts, so the cost is
+		O((len(spans) + intervals) log intervals) instead of one bisect walk
+		per span.
+		"""
+		entries = self._entries.get(key, ())
+		active: List[Tuple[int, str]] = []
+		conflicts = []
+		j = 0
+		for pos, (start, end) in enumerate(spans):
+			while j < len(entries) and entries[j][0] < end:
+				s, e, item_id = entries[j]
+				if item_id not in exclude:
+					heapq.heappush(active, (e, item_id))
+				j += 1
+			while active and active[0][0] <= start:
+				heapq.heappop(active)
+			if active:
+				conflicts.append((pos, active[0][1]))
+		return conflicts
+
+	def overlapping(self, key: Hashable, start: int, end: int) -> List[Tuple[int, int, str]]:
+		"""Intervals under `key` overlapping [start, end), ordered by start time."""
+		entries = self._entries.get(key)
+		if not entries:
+			return []
+		starts = self._starts[key]
+		lo = bisect_left(starts, start - self._max_len.get(key, 0))
+		hi = bisect_left(starts, end)
+		return [entry for entry in entries[lo:hi] if entry[1] > start]
+
+	def span(self, key: Hashable, item_id: str) -> Optional[Tuple[int, int]]:
+		return self._where.get((key, item_id))
+
+	def items(self, key: Hashable) -> List[Tuple[int, int, str]]:
+		"""Intervals stored under `key`, ordered by start time."""
+		return list(self._entries.get(key, ()))
+
+	def items_from(self, key: Hashable, start: int) -> List[Tuple[int, int, str]]:
+		"""Intervals under `key` starting at or after `start`, ordered by start time."""
+		entries = self._entries.get(key)
+		if not entries:
+			return []
+		return entries[bisect_left(self._starts[key], start):]
+
+	def keys(self) -> List[Hashable]:
+		return list(self._entries.keys())
@@ -2,26 +2,123 @@
 
 This module contains the core operations separated from HTTP routes so they
 can be unit-tested and reused. It uses the in-memory `db` from
-`core.database` and ensures simple thread-safety for write operations.
+`core.database`; writes are serialized per appointment / tutor / student
+through striped locks rather than one global lock.
 """
+from contextlib import contextmanager
 from datetime import datetime
+import os
+import re
 import threading
+import unicodedata
 import uuid
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Set
 
-from core.database import db
-from core.models import Appointment
+from core.database import db, register_rebuild_hook, mark_dirty
+from core.models import AppointmentRecord, STATUS_OPEN, STATUS_CANCELLED, epoch_seconds, format_epoch
+from core.security import _role_name
+from .interval_index import IntervalIndex
+from .availability import AvailabilityStore, cells_to_bits, bits_to_cells, range_mask
 
-# Simple lock to avoid race conditions on the in-memory `db`.
-_lock = threading.Lock()
+# Lock striping: every appointment, tutor and student id hashes onto one of
+# N locks. An operation takes the stripes of everything it touches in
+# ascending stripe order (so two operations can never deadlock), which lets
+# writes on unrelated appointments/people run in parallel. N = 1 behaves
+# like a single global lock.
+_stripes: List[threading.Lock] = []
+
+
+def set_lock_stripes(count: int) -> None:
+	"""(Re)create the lock stripes. Only call while no write is in flight."""
+	global _stripes
+	_stripes = [threading.Lock() for _ in range(max(1, int(count)))]
+
+
+set_lock_stripes(int(os.environ.get("SCHEDULING_LOCK_STRIPES", "64")))
+
+
+@contextmanager
+def _locked(apt_ids=(), tutor_ids=(), student_ids=(), room_ids=()):
+	keys = [("apt", k) for k in apt_ids] + [("tutor", k) for k in tutor_ids] + [("student", k) for k in student_ids]
+	keys += [("room", k) for k in room_ids if k]
+	stripes = _stripes
+	held = sorted({hash(k) % len(stripes) for k in keys})
+	for i in held:
+		stripes[i].acquire()
+	try:
+		yield
+	finally:
+		for i in reversed(held):
+			stripes[i].release()
+
+
+@contextmanager
+def _locked_all():
+	stripes = _stripes
+	for lock in stripes:
+		lock.acquire()
+	try:
+		yield
+	finally:
+		for lock in reversed(stripes):
+			lock.release()
+
+
+@contextmanager
+def _locked_with_roster(apt: AppointmentRecord, tutor_ids=(), room_ids=()):
+	"""Lock `apt`, its room, `tutor_ids`/`room_ids` and every student on its roster.
+
+	The roster is read before locking, so retry if a booking slipped in
+	between; once the appointment's stripe is held it cannot change again.
+	"""
+	with _locked_with_rosters([apt], tutor_ids, room_ids):
+		yield
+
+
+@contextmanager
+def _locked_with_rosters(apts: List[AppointmentRecord], tutor_ids=(), room_ids=()):
+	while True:
+		students = {sid for apt in apts for sid in list(apt.roster)}
+		rooms = {room_key(apt.place) for apt in apts} | set(room_ids)
+		with _locked([apt.id for apt in apts], tutor_ids, students, rooms):
+			if all(set(apt.roster) <= students and room_key(apt.place) in rooms for apt in apts):
+				yield
+				return
+
+# Non-cancelled appointments per tutor / per booked student, on epoch seconds.
+_tutor_index = IntervalIndex()
+_student_index = IntervalIndex()
+# Every appointment a student is on the roster of (cancelled ones included),
+# backing the student's own "my appointments" view.
+_bookings_index = IntervalIndex()
+# Non-cancelled appointments per physical room (see `room_key`).
+_room_index = IntervalIndex()
+_rooms: Set[str] = set()  # room keys seen so far, for listings
+
+# A campus room code, e.g. "H6-304", "B4 201", "C6.102A"; an optional
+# "Phòng " / "P." in front is dropped. Anything else (a Meet/Zoom link,
+# "Online - Zoom", "Google Meet nhóm 1", ...) is not a physical room.
+_ROOM_PREFIX_RE = re.compile(r"^(?:PHÒNG|PHONG|P\.)\s*")
+_ROOM_CODE_RE = re.compile(r"^([A-Z]{1,2}\d{0,2})\s*[-.]?\s*(\d{2,4}[A-Z]?)$")
+
+
+def room_key(place: Optional[str]) -> Optional[str]:
+	"""Canonical room code ("Phòng h6 304" -> "H6-304"), or None if `place` is not a room."""
+	text = " ".join(unicodedata.normalize("NFC", str(place or "")).split()).upper()
+	match = _ROOM_CODE_RE.match(_ROOM_PREFIX_RE.sub("", text))
+	if match is None:
+		return None
+	return f"{match.group(1)}-{match.group(2)}"
 
 
 class LogicError(Exception):
 	"""Raised when a business rule fails."""
-	def __init__(self, message: str, status_code: int = 400):
+	def __init__(self, message: str, status_code: int = 400, details: Optional[dict] = None):
 		super().__init__(message)
 		self.message = message
 		self.status_code = status_code
+		# Extra JSON fields for the error response (e.g. the list of conflicts)
+		self.details = details
 
 
 def _parse_time(time_str: str) -> datetime:
@@ -31,7 +128,54 @@ def _parse_time(time_str: str) -> datetime:
 		raise LogicError("Sai định dạng ngày giờ (YYYY-MM-DD HH:MM:SS)", 400)
 
 
-def create_appointment(tutor_id: str, name: str, start_str: str, end_str: str, place: str, max_slot: int) -> Dict:
+def _index_appointment(apt: AppointmentRecord) -> None:
+	"""(Re)insert into the booking index and, unless cancelled, the overlap indexes."""
+	for sid in apt.roster:
+		_bookings_index.add(sid, apt.id, apt.start, apt.end)
+	if apt.status == STATUS_CANCELLED:
+		return
+	_tutor_index.add(apt.tutor_id, apt.id, apt.start, apt.end)
+	room = room_key(apt.place)
+	if room:
+		_rooms.add(room)
+		_room_index.add(room, apt.id, apt.start, apt.end)
+	for sid in apt.roster:
+		_student_index.add(sid, apt.id, apt.start, apt.end)
+
+
+def _unindex_appointment(apt: AppointmentRecord) -> None:
+	_tutor_index.remove(apt.tutor_id, apt.id)
+	for sid in apt.roster:
+		_student_index.remove(sid, apt.id)
+	room = room_key(apt.place)
+	if room:
+		_room_index.remove(room, apt.id)
+
+
+def _check_room(place: str, start: int, end: int, exclude: Optional[str] = None) -> None:
+	"""Raise 409 if the physical room behind `place` is taken in [start, end)."""
+	room = room_key(place)
+	if not room:
+		return
+	clash = _room_index.find_conflict(room, start, end, exclude=exclude)
+	if clash:
+		raise LogicError(f'Phòng {place.strip()} đã có buổi "{db["appointments"][clash].name}" trong khung giờ này', 409)
+
+
+@register_rebuild_hook
+def rebuild_indexes() -> None:
+	"""Rebuild the overlap indexes from `db["appointments"]`."""
+	with _locked_all():
+		_tutor_index.clear()
+		_student_index.clear()
+		_bookings_index.clear()
+		_room_index.clear()
+		_rooms.clear()
+		for apt in db.get("appointments", {}).values():
+			_index_appointment(apt)
+
+
+def create_appointment(tutor_id: str, name: str, start_str: str, end_str: str, place: str, max_slot: int) -> AppointmentRecord:
 	start = _parse_time(start_str)
 	end = _parse_time(end_str)
 
@@ -45,105 +189,211 @@ def create_appointment(tutor_id: str, name: str, start_str: str, end_str: str, p
 	if max_slot <= 0:
 		raise LogicError("max_slot phải lớn hơn 0", 400)
 
-	# Check overlapping for same tutor
-	for apt in db.get("appointments", {}).values():
-		if apt.get("status") == "CANCELLED":
-			continue
-		if apt.get("tutor_id") != tutor_id:
-			continue
-
-		exist_start = _parse_time(apt.get("start_time"))
-		exist_end = _parse_time(apt.get("end_time"))
-		if (start < exist_end) and (end > exist_start):
-			raise LogicError(f'Bị trùng lịch với buổi: {apt.get("name")}', 409)
-
+	start, end = epoch_seconds(start), epoch_seconds(end)
 	apt_id = str(uuid.uuid4())
-	new_apt = Appointment(
+	new_apt = AppointmentRecord(
 		id=apt_id,
 		tutor_id=tutor_id,
 		name=name,
-		start_time=start_str,
-		end_time=end_str,
+		start=start,
+		end=end,
 		place=place,
 		max_slot=max_slot,
 	)
-	with _lock:
+	with _locked(tutor_ids=(tutor_id,), room_ids=(room_key(place),)):
+		# Check overlapping for same tutor and same room (atomically with the insert)
+		clash = _tutor_index.find_conflict(tutor_id, start, end)
+		if clash:
+			raise LogicError(f'Bị trùng lịch với buổi: {db["appointments"][clash].name}', 409)
+		_check_room(place, start, end)
+
 		db.setdefault("appointments", {})
-		db["appointments"][apt_id] = new_apt.to_dict()
+		db["appointments"][apt_id] = new_apt
+		_index_appointment(new_apt)
+		mark_dirty("appointments", apt_id)
 
-	return db["appointments"][apt_id]
+	return new_apt
 
 
-def cancel_appointment(apt_id: str, user_id: str) -> Dict:
+def cancel_appointment(apt_id: str, user_id: str) -> AppointmentRecord:
 	appts = db.get("appointments", {})
 	if apt_id not in appts:
 		raise LogicError("Không tìm thấy lịch", 404)
 
 	apt = appts[apt_id]
-	if apt.get("tutor_id") != user_id:
+	if apt.tutor_id != user_id:
 		raise LogicError("Không có quyền xóa lịch này", 403)
 
-	with _lock:
-		apt["status"] = "CANCELLED"
+	with _locked_with_roster(apt, tutor_ids=(apt.tutor_id,)):
+		_unindex_appointment(apt)
+		apt.status = STATUS_CANCELLED
+		mark_dirty("appointments", apt_id)
 
 	return apt
 
 
-def book_appointment(apt_id: str, student_id: str) -> Dict:
+def book_appointment(apt_id: str, student_id: str) -> AppointmentRecord:
 	appts = db.get("appointments", {})
 	if apt_id not in appts:
 		raise LogicError("Lịch không tồn tại", 404)
 
 	apt = appts[apt_id]
-	if apt.get("status") != "OPEN":
-		raise LogicError("Lịch này không khả dụng", 400)
+	# Compare-and-book: status, capacity and conflict checks and the slot
+	# append happen under the appointment's and the student's stripes.
+	with _locked((apt_id,), student_ids=(student_id,)):
+		if apt.status != STATUS_OPEN:
+			raise LogicError("Lịch này không khả dụng", 400)
+
+		if student_id in apt.roster:
+			raise LogicError("Bạn đã đặt lịch này rồi", 400)
+
+		if len(apt.roster) >= apt.max_slot:
+			raise LogicError("Lịch đã đầy", 400)
+
+		clash = _student_index.find_conflict(student_id, apt.start, apt.end)
+		if clash:
+			raise LogicError(f'Bạn bị trùng giờ với lịch {appts[clash].name}', 409)
+
+		_add_to_roster(apt, student_id)
+		if student_id in db.get("users", {}):
+			mark_dirty("users", student_id)
+		mark_dirty("appointments", apt_id)
+	return apt
 
-	if student_id in apt.get("current_slots", []):
-		raise LogicError("Bạn đã đặt lịch này rồi", 400)
 
-	if len(apt.get("current_slots", [])) >= apt.get("max_slot", 0):
-		raise LogicError("Lịch đã đầy", 400)
+def _add_to_roster(apt: AppointmentRecord, student_id: str) -> None:
+	"""Seat `student_id` on `apt` and update the indexes (caller holds the stripes)."""
+	apt.roster[student_id] = None
+	_student_index.add(student_id, apt.id, apt.start, apt.end)
+	_bookings_index.add(student_id, apt.id, apt.start, apt.end)
 
-	cur_start = _parse_time(apt.get("start_time"))
-	cur_end = _parse_time(apt.get("end_time"))
-	for other in appts.values():
-		if other.get("status") != "OPEN":
-			continue
-		if student_id not in other.get("current_slots", []):
-			continue
-		other_start = _parse_time(other.get("start_time"))
-		other_end = _parse_time(other.get("end_time"))
-		if (cur_start < other_end) and (cur_end > other_start):
-			raise LogicError(f'Bạn bị trùng giờ với lịch {other.get("name")}', 409)
+	users = db.setdefault("users", {})
+	if student_id in users:
+		b = users[student_id].setdefault("booked_appointments", [])
+		if apt.id not in b:
+			b.append(apt.id)
 
-	with _lock:
-		apt.setdefault("current_slots", [])
-		apt["current_slots"].append(student_id)
 
-		users = db.setdefault("users", {})
-		if student_id in users:
-			user = users[student_id]
-			b = user.setdefault("booked_appointments", [])
-			if apt_id not in b:
-				b.append(apt_id)
-	return apt
+BULK_ENROLL_MAX_PAIRS = int(os.environ.get("BULK_ENROLL_MAX_PAIRS", "5000"))
+
+
+def _valid_pair(pair) -> bool:
+	return (isinstance(pair, dict)
+	        and isinstance(pair.get("appointment_id"), str) and pair["appointment_id"] != ""
+	        and isinstance(pair.get("student_id"), str) and pair["student_id"] != "")
+
+
+def bulk_enroll(pairs: List[Dict], actor_id: str, actor_role: str, all_or_nothing: bool = False) -> Dict:
+	"""Enroll many (appointment_id, student_id) pairs in one locked pass.
+
+	Every pair gets its own result. Capacity and time conflicts are checked
+	against the stored state plus the pairs accepted earlier in the same
+	batch, and all accepted pairs are applied under a single acquisition of
+	the stripes involved. With `all_or_nothing`, one failure rejects the
+	whole batch. A TUTOR may only enroll into their own sessions.
+	"""
+	if not isinstance(pairs, list) or not pairs:
+		raise LogicError("enrollments phải là danh sách khác rỗng", 400)
+	if len(pairs) > BULK_ENROLL_MAX_PAIRS:
+		raise LogicError(f"Tối đa {BULK_ENROLL_MAX_PAIRS} cặp mỗi lần", 400)
+
+	appts = db.get("appointments", {})
+	users = db.get("users", {})
+	apt_ids, student_ids = set(), set()
+	for pair in pairs:
+		if _valid_pair(pair):
+			apt_ids.add(pair["appointment_id"])
+			student_ids.add(pair["student_id"])
+
+	results = []
+	accepted = []
+	with _locked(apt_ids, student_ids=student_ids):
+		seats = {}          # apt_id -> seats taken including this batch
+		batch_spans = {}    # student_id -> [(start, end, apt_id)] accepted in this batch
+
+		for i, pair in enumerate(pairs):
+			apt_id = pair.get("appointment_id") if isinstance(pair, dict) else None
+			student_id = pair.get("student_id") if isinstance(pair, dict) else None
+			result = {"index": i, "appointment_id": apt_id, "student_id": student_id}
+			results.append(result)
+			if not _valid_pair(pair):
+				result.update(status="FAILED", reason="invalid_input", code=400,
+				              error="appointment_id và student_id phải là chuỗi khác rỗng")
+				continue
+			try:
+				apt = appts.get(apt_id)
+				if apt is None:
+					raise LogicError("Lịch không tồn tại", 404)
+				if actor_role == "TUTOR" and apt.tutor_id != actor_id:
+					raise LogicError("Không có quyền thêm sinh viên vào lịch này", 403)
+				student = users.get(student_id)
+				if student is None or _role_name(student.get("role")) != "STUDENT":
+					raise LogicError("Không tìm thấy sinh viên", 404)
+				if apt.status != STATUS_OPEN:
+					raise LogicError("Lịch này không khả dụng", 400)
+				if student_id in apt.roster or any(a == apt_id for _, _, a in batch_spans.get(student_id, ())):
+					raise LogicError("Sinh viên đã có trong lịch này", 400)
+				taken = seats.get(apt_id, len(apt.roster))
+				if taken >= apt.max_slot:
+					raise LogicError("Lịch đã đầy", 400)
+				clash = _student_index.find_conflict(student_id, apt.start, apt.end)
+				if clash is None:
+					for s, e, other in batch_spans.get(student_id, ()):
+						if s < apt.end and e > apt.start:
+							clash = other
+							break
+				if clash:
+					raise LogicError(f"Sinh viên bị trùng giờ với lịch {appts[clash].name}", 409)
+			except LogicError as e:
+				result.update(status="FAILED", error=e.message, code=e.status_code)
+				continue
+
+			seats[apt_id] = taken + 1
+			batch_spans.setdefault(student_id, []).append((apt.start, apt.end, apt_id))
+			accepted.append((apt, student_id))
+			result["status"] = "ENROLLED"
+
+		failed = len(pairs) - len(accepted)
+		if all_or_nothing and failed:
+			for result in results:
+				if result["status"] == "ENROLLED":
+					result.update(status="SKIPPED", error="Lô bị huỷ do có cặp lỗi", code=409)
+			accepted = []
+
+		for apt, student_id in accepted:
+			_add_to_roster(apt, student_id)
+		for student_id in {sid for _, sid in accepted}:
+			mark_dirty("users", student_id)
+		for apt_id in {apt.id for apt, _ in accepted}:
+			mark_dirty("appointments", apt_id)
+
+	return {
+		"enrolled": len(accepted),
+		"failed": failed,
+		"results": results,
+	}
 
 
 def list_appointments(tutor_id: Optional[str] = None) -> List[Dict]:
     res = []
     users = db.get("users", {}) # Lấy danh sách user để tra cứu tên
     
-    for apt in db.get("appointments", {}).values():
-        if apt.get("status") == "CANCELLED":
-            continue
-        if tutor_id and apt.get("tutor_id") != tutor_id:
+    if tutor_id:
+        # Lịch của một tutor đã có sẵn trong index, khỏi duyệt toàn bộ
+        appts = db.get("appointments", {})
+        candidates = [appts[item_id] for _, _, item_id in _tutor_index.items(tutor_id)]
+    else:
+        candidates = db.get("appointments", {}).values()
+
+    for apt in candidates:
+        if apt.status == STATUS_CANCELLED:
             continue
-        
-        # Copy ra dict mới để không ảnh hưởng dữ liệu gốc
-        apt_data = apt.copy()
+
+        # Chỉ chuyển sang dict (JSON shape) ở đây, khi trả ra API
+        apt_data = apt.to_dict()
         
         # --- THÊM TÊN TUTOR ---
-        tutor = users.get(apt.get("tutor_id"))
+        tutor = users.get(apt.tutor_id)
         apt_data["tutor_name"] = tutor["name"] if tutor else "Unknown Tutor"
         # ----------------------
 
@@ -151,29 +401,44 @@ def list_appointments(tutor_id: Optional[str] = None) -> List[Dict]:
     return res
 
 
-def cancel_student_appointment(apt_id: str, student_id: str) -> Dict:
+def list_student_appointments(student_id: str, upcoming: bool = False) -> List[Dict]:
+	"""Appointments the student is booked on, ordered by start time.
+
+	With `upcoming`, only sessions that have not started yet.
+	"""
+	appts = db.get("appointments", {})
+	if upcoming:
+		entries = _bookings_index.items_from(student_id, epoch_seconds(datetime.now()))
+	else:
+		entries = _bookings_index.items(student_id)
+
+	res = []
+	for _, _, item_id in entries:
+		apt = appts.get(item_id)
+		if apt is not None:
+			res.append(apt.to_dict())
+	return res
+
+
+def cancel_student_appointment(apt_id: str, student_id: str) -> AppointmentRecord:
 	appts = db.get("appointments", {})
 	if apt_id not in appts:
 		raise LogicError("Lịch không tồn tại", 404)
 
 	apt = appts[apt_id]
-	if apt.get("status") == "CANCELLED":
-		raise LogicError("Buổi đã bị hủy; không thể huỷ đặt", 400)
+	with _locked((apt_id,), student_ids=(student_id,)):
+		if apt.status == STATUS_CANCELLED:
+			raise LogicError("Buổi đã bị hủy; không thể huỷ đặt", 400)
 
-	if student_id not in apt.get("current_slots", []):
-		raise LogicError("Bạn chưa đặt lịch này", 400)
+		if student_id not in apt.roster:
+			raise LogicError("Bạn chưa đặt lịch này", 400)
 
-	try:
-		start = _parse_time(apt.get("start_time"))
-		if datetime.now() >= start:
+		if epoch_seconds(datetime.now()) >= apt.start:
 			raise LogicError("Không thể huỷ sau khi buổi học đã bắt đầu", 400)
-	except LogicError:
-		raise
 
-	with _lock:
-		slots = apt.setdefault("current_slots", [])
-		if student_id in slots:
-			slots.remove(student_id)
+		apt.roster.pop(student_id, None)
+		_student_index.remove(student_id, apt_id)
+		_bookings_index.remove(student_id, apt_id)
 
 		users = db.setdefault("users", {})
 		if student_id in users:
@@ -181,57 +446,57 @@ def cancel_student_appointment(apt_id: str, student_id: str) -> Dict:
 			b = user.setdefault("booked_appointments", [])
 			if apt_id in b:
 				b.remove(apt_id)
+			mark_dirty("users", student_id)
+		mark_dirty("appointments", apt_id)
 
 	return apt
 
 # Đổi lịch: Cập nhật giờ, địa điểm, hình thức và số lượng
-def reschedule_appointment(apt_id: str, tutor_id: str, new_start_str: str, new_end_str: str, new_place: str, new_mode: str = None, new_max_slot: int = None) -> Dict:
+def reschedule_appointment(apt_id: str, tutor_id: str, new_start_str: str, new_end_str: str, new_place: str, new_mode: str = None, new_max_slot: int = None) -> AppointmentRecord:
     """Đổi lịch: Cập nhật giờ, địa điểm, hình thức và số lượng"""
     appts = db.get("appointments", {})
     if apt_id not in appts:
         raise LogicError("Không tìm thấy lịch", 404)
 
     apt = appts[apt_id]
-    if apt.get("tutor_id") != tutor_id:
+    if apt.tutor_id != tutor_id:
         raise LogicError("Không có quyền sửa lịch này", 403)
 
-    if apt.get("status") == "CANCELLED":
-        raise LogicError("Không thể đổi lịch đã hủy", 400)
-
     start = _parse_time(new_start_str)
     end = _parse_time(new_end_str)
     if start >= end:
         raise LogicError("Thời gian kết thúc phải sau thời gian bắt đầu", 400)
-
-    # Check overlapping (Trừ chính nó ra)
-    for other_id, other_apt in appts.items():
-        if other_id == apt_id: continue
-        if other_apt.get("status") == "CANCELLED": continue
-        if other_apt.get("tutor_id") != tutor_id: continue
-
-        exist_start = _parse_time(other_apt.get("start_time"))
-        exist_end = _parse_time(other_apt.get("end_time"))
-        
-        if (start < exist_end) and (end > exist_start):
-            raise LogicError(f'Thời gian mới bị trùng với buổi: {other_apt.get("name")}', 409)
-
-    with _lock:
-        apt["start_time"] = new_start_str
-        apt["end_time"] = new_end_str
-        apt["place"] = new_place
+    start, end = epoch_seconds(start), epoch_seconds(end)
+
+    with _locked_with_roster(apt, tutor_ids=(tutor_id,), room_ids=(room_key(new_place),)):
+        if apt.status == STATUS_CANCELLED:
+            raise LogicError("Không thể đổi lịch đã hủy", 400)
+
+        # Check overlapping (Trừ chính nó ra)
+        clash = _tutor_index.find_conflict(tutor_id, start, end, exclude=apt_id)
+        if clash:
+            raise LogicError(f'Thời gian mới bị trùng với buổi: {appts[clash].name}', 409)
+        _check_room(new_place, start, end, exclude=apt_id)
+
+        _unindex_appointment(apt)
+        apt.start = start
+        apt.end = end
+        apt.place = new_place
+        _index_appointment(apt)
         
         # Cập nhật thêm Hình thức (mode)
         if new_mode:
-            apt["mode"] = new_mode
+            apt.set_extra("mode", new_mode)
             
         # Cập nhật thêm Số lượng (max_slot)
         if new_max_slot is not None:
             try:
                 new_val = int(new_max_slot)
                 # (Tùy chọn) Có thể check nếu new_val < số lượng đã book
-                apt["max_slot"] = new_val
+                apt.max_slot = new_val
             except:
                 pass
+        mark_dirty("appointments", apt_id)
     
     return apt
 # Lưu biên bản buổi học (minutes)
@@ -241,7 +506,7 @@ def save_minutes(apt_id: str, tutor_id: str, content: str, student_results: list
         raise LogicError("Không tìm thấy buổi học", 404)
     
     apt = appts[apt_id]
-    if apt.get("tutor_id") != tutor_id:
+    if apt.tutor_id != tutor_id:
         raise LogicError("Bạn không phải là Tutor của buổi này", 403)
 
     # Khởi tạo kho lưu minutes nếu chưa có
@@ -258,4 +523,411 @@ def save_minutes(apt_id: str, tutor_id: str, content: str, student_results: list
     }
     
     db["minutes"][apt_id] = minutes_data
-    return minutes_data
\ No newline at end of file
+    mark_dirty("minutes", apt_id)
+    return minutes_data
+
+
+# --- Chuỗi buổi định kỳ (recurring series) ---
+
+SERIES_MAX_OCCURRENCES = 60
+_FREQUENCIES = {"DAILY": 86400, "WEEKLY": 7 * 86400}
+
+
+def add_feedback(apt_id: str, entry: Dict, on_added=None) -> int:
+	"""Append `entry` to the appointment's feedback under its stripe lock.
+
+	`on_added(apt, position)` runs under the same lock, so a derived index
+	sees positions in the order they were appended. Returns the position.
+	"""
+	with _locked(apt_ids=[apt_id]):
+		apt = db.get("appointments", {}).get(apt_id)
+		if apt is None:
+			raise LogicError("Appointment not found", 404)
+		position = apt.add_feedback(entry)
+		if on_added is not None:
+			on_added(apt, position)
+		mark_dirty("appointments", apt_id)
+	return position
+
+
+def _expand_series(start: int, end: int, frequency: str, interval: int, count: int,
+                   exceptions: List[str]) -> List[tuple]:
+	"""Return [(occurrence number, start, end)] in time order, skipping exception dates."""
+	period = _FREQUENCIES[frequency] * interval
+	if end - start >= period:
+		raise LogicError("Mỗi buổi phải ngắn hơn chu kỳ lặp", 400)
+	skip = set(exceptions)
+	spans = []
+	for n in range(count):
+		s = start + n * period
+		if format_epoch(s)[:10] in skip:
+			continue
+		spans.append((n + 1, s, end + n * period))
+	return spans
+
+
+def _series_int(field: str, value) -> int:
+	"""A positive integer (or its decimal string); floats, booleans and 0 are rejected."""
+	if isinstance(value, str) and value.strip().isdigit():
+		value = int(value)
+	if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+		raise LogicError(f"{field} phải là số nguyên dương", 400, details={"value": value})
+	return value
+
+
+def _series_exceptions(exceptions) -> List[str]:
+	"""Validate `exceptions` as a list of YYYY-MM-DD strings."""
+	if exceptions is None:
+		return []
+	if not isinstance(exceptions, list):
+		raise LogicError("exceptions phải là danh sách ngày YYYY-MM-DD", 400, details={"value": exceptions})
+	for day in exceptions:
+		try:
+			valid = isinstance(day, str) and len(day) == 10 and datetime.strptime(day, "%Y-%m-%d")
+		except ValueError:
+			valid = False
+		if not valid:
+			raise LogicError("exceptions phải là danh sách ngày YYYY-MM-DD", 400, details={"value": day})
+	return list(exceptions)
+
+
+def _series_conflicts(clashes, occurrence_of, start_of) -> List[Dict]:
+	"""One entry per clashing occurrence, ordered by position.
+
+	`clashes` holds (position, conflicting appointment id, "tutor" | "room").
+	An occurrence that clashes on both counts is listed once, with every
+	cause in `reasons`; `conflict_with` / `conflict_name` name the first one.
+	"""
+	merged: Dict[int, Dict] = {}
+	for pos, item_id, kind in sorted(clashes, key=lambda c: (c[0], c[2] != "tutor")):
+		reason = {"type": kind, "conflict_with": item_id, "conflict_name": db["appointments"][item_id].name}
+		entry = merged.get(pos)
+		if entry is None:
+			merged[pos] = {
+				"occurrence": occurrence_of(pos),
+				"start_time": format_epoch(start_of(pos)),
+				"conflict_with": item_id,
+				"conflict_name": reason["conflict_name"],
+				"reasons": [reason],
+			}
+		else:
+			entry["reasons"].append(reason)
+	return [merged[pos] for pos in sorted(merged)]
+
+
+def create_series(tutor_id: str, name: str, start_str: str, end_str: str, place: str, max_slot: int,
+                  frequency: str = "WEEKLY", interval: int = 1, count: int = 1,
+                  exceptions: Optional[List[str]] = None, skip_conflicts: bool = False) -> Dict:
+	"""Expand a recurring series and create every occurrence in one go.
+
+	All occurrences are checked against the tutor's schedule with a single
+	sorted sweep (`IntervalIndex.find_conflicts`). Without `skip_conflicts`
+	any clash rejects the whole series (409, `conflicts` attached to the
+	error); with it, clashing occurrences are left out and reported.
+	"""
+	start = _parse_time(start_str)
+	end = _parse_time(end_str)
+	if start >= end:
+		raise LogicError("Thời gian kết thúc phải sau thời gian bắt đầu", 400)
+	if frequency is None:
+		frequency = "WEEKLY"
+	if not isinstance(frequency, str) or frequency.upper() not in _FREQUENCIES:
+		raise LogicError(f"frequency phải là một trong: {', '.join(_FREQUENCIES)}", 400,
+		                 details={"value": frequency})
+	frequency = frequency.upper()
+	interval = _series_int("interval", interval)
+	count = _series_int("count", count)
+	max_slot = _series_int("max_slot", max_slot)
+	if not 1 <= count <= SERIES_MAX_OCCURRENCES:
+		raise LogicError(f"count phải trong khoảng 1..{SERIES_MAX_OCCURRENCES}", 400)
+	exceptions = _series_exceptions(exceptions)
+
+	occurrences = _expand_series(epoch_seconds(start), epoch_seconds(end), frequency, interval, count, exceptions)
+	if not occurrences:
+		raise LogicError("Chuỗi không còn buổi nào sau khi bỏ ngày ngoại lệ", 400)
+
+	series_id = str(uuid.uuid4())
+	appts = db.setdefault("appointments", {})
+	room = room_key(place)
+	with _locked(tutor_ids=(tutor_id,), room_ids=(room,)):
+		spans = [(s, e) for _, s, e in occurrences]
+		clashes = [(pos, item_id, "tutor") for pos, item_id in _tutor_index.find_conflicts(tutor_id, spans)]
+		if room:
+			clashes += [(pos, item_id, "room") for pos, item_id in _room_index.find_conflicts(room, spans)]
+		conflicts = _series_conflicts(clashes, lambda p: occurrences[p][0], lambda p: occurrences[p][1])
+		if conflicts and not skip_conflicts:
+			raise LogicError(f"{len(conflicts)} buổi trong chuỗi bị trùng lịch", 409,
+			                 details={"conflicts": conflicts})
+
+		clashing = {pos for pos, _, _ in clashes}
+		created = []
+		for pos, (n, s, e) in enumerate(occurrences):
+			if pos in clashing:
+				continue
+			apt = AppointmentRecord(
+				id=str(uuid.uuid4()),
+				tutor_id=tutor_id,
+				name=name,
+				start=s,
+				end=e,
+				place=place,
+				max_slot=max_slot,
+				extra={"series_id": series_id, "occurrence": n},
+			)
+			appts[apt.id] = apt
+			_index_appointment(apt)
+			created.append(apt)
+		if not created:
+			raise LogicError("Tất cả các buổi trong chuỗi đều bị trùng lịch", 409,
+			                 details={"conflicts": conflicts})
+
+		series = {
+			"id": series_id,
+			"tutor_id": tutor_id,
+			"name": name,
+			"frequency": frequency,
+			"interval": interval,
+			"count": count,
+			"exceptions": exceptions,
+			"appointment_ids": [apt.id for apt in created],
+			"created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+		}
+		db.setdefault("series", {})[series_id] = series
+		for apt in created:
+			mark_dirty("appointments", apt.id)
+		mark_dirty("series", series_id)
+
+	return {"series": series, "appointments": created, "skipped": conflicts}
+
+
+def get_series(series_id: str) -> Dict:
+	series = db.get("series", {}).get(series_id)
+	if series is None:
+		raise LogicError("Không tìm thấy chuỗi lịch", 404)
+	return series
+
+
+def _series_upcoming(series: Dict) -> List[AppointmentRecord]:
+	"""Non-cancelled occurrences that have not started yet, in time order."""
+	appts = db.get("appointments", {})
+	now = epoch_seconds(datetime.now())
+	res = [appts[i] for i in series["appointment_ids"] if i in appts]
+	return sorted((a for a in res if a.status != STATUS_CANCELLED and a.start > now),
+	              key=lambda a: a.start)
+
+
+def cancel_series(series_id: str, tutor_id: str) -> List[AppointmentRecord]:
+	"""Cancel every upcoming occurrence of a series (past sessions are kept)."""
+	series = get_series(series_id)
+	if series["tutor_id"] != tutor_id:
+		raise LogicError("Không có quyền huỷ chuỗi lịch này", 403)
+
+	upcoming = _series_upcoming(series)
+	with _locked_with_rosters(upcoming, tutor_ids=(tutor_id,)):
+		for apt in upcoming:
+			_unindex_appointment(apt)
+			apt.status = STATUS_CANCELLED
+			mark_dirty("appointments", apt.id)
+	return upcoming
+
+
+def reschedule_series(series_id: str, tutor_id: str, new_start_str: str, new_end_str: str,
+                      new_place: Optional[str] = None) -> List[AppointmentRecord]:
+	"""Move every upcoming occurrence of a series.
+
+	`new_start_str`/`new_end_str` are the new times of the first upcoming
+	occurrence; the same shift and duration apply to the following ones.
+	"""
+	series = get_series(series_id)
+	if series["tutor_id"] != tutor_id:
+		raise LogicError("Không có quyền sửa chuỗi lịch này", 403)
+
+	start = _parse_time(new_start_str)
+	end = _parse_time(new_end_str)
+	if start >= end:
+		raise LogicError("Thời gian kết thúc phải sau thời gian bắt đầu", 400)
+	start, end = epoch_seconds(start), epoch_seconds(end)
+
+	upcoming = _series_upcoming(series)
+	if not upcoming:
+		raise LogicError("Chuỗi không còn buổi nào sắp diễn ra", 400)
+
+	with _locked_with_rosters(upcoming, tutor_ids=(tutor_id,), room_ids=(room_key(new_place),)):
+		shift = start - upcoming[0].start
+		duration = end - start
+		spans = [(a.start + shift, a.start + shift + duration) for a in upcoming]
+		for (s, e), nxt in zip(spans, spans[1:]):
+			if e > nxt[0]:
+				raise LogicError("Các buổi trong chuỗi bị chồng lên nhau sau khi đổi lịch", 400)
+		own = {a.id for a in upcoming}
+		clashes = [(p, i, "tutor") for p, i in _tutor_index.find_conflicts(tutor_id, spans, exclude=own)]
+		# Group occurrences by the room they will be in, one sweep per room
+		by_room: Dict[str, List[int]] = {}
+		for p, apt in enumerate(upcoming):
+			room = room_key(new_place or apt.place)
+			if room:
+				by_room.setdefault(room, []).append(p)
+		for room, positions in by_room.items():
+			found = _room_index.find_conflicts(room, [spans[p] for p in positions], exclude=own)
+			clashes += [(positions[k], item_id, "room") for k, item_id in found]
+		if clashes:
+			conflicts = _series_conflicts(clashes, lambda p: (upcoming[p].extra or {}).get("occurrence"),
+			                              lambda p: spans[p][0])
+			first = conflicts[0]
+			raise LogicError(f'Buổi {first["start_time"]} bị trùng với buổi: {first["conflict_name"]}', 409,
+			                 details={"conflicts": conflicts})
+
+		for apt, (s, e) in zip(upcoming, spans):
+			_unindex_appointment(apt)
+			apt.start, apt.end = s, e
+			if new_place:
+				apt.place = new_place
+			_index_appointment(apt)
+			mark_dirty("appointments", apt.id)
+	return upcoming
+
+
+# --- Lịch rảnh (free schedule) dạng bitmap ---
+
+# Tutor-week availability bitsets; `db["free_schedules"][tutor_id][week]`
+# holds {"bits": int, "note": str} and is the persisted copy.
+_availability = AvailabilityStore()
+
+
+def _stored_bits(entry) -> int:
+	"""Bits of a stored week; older entries kept the raw `cells` list."""
+	if isinstance(entry, list):
+		entry = {"cells": entry}
+	if not isinstance(entry, dict):
+		return 0
+	if "bits" in entry:
+		return int(entry["bits"])
+	try:
+		return cells_to_bits(entry.get("cells") or [])
+	except ValueError:
+		return 0
+
+
+@register_rebuild_hook
+def rebuild_availability() -> None:
+	_availability.clear()
+	for tutor_id, weeks in list(db.get("free_schedules", {}).items()):
+		if not isinstance(weeks, dict):
+			continue
+		for week, entry in weeks.items():
+			_availability.set(tutor_id, str(week), _stored_bits(entry))
+
+
+def save_free_schedule(tutor_id: str, week: str, cells: List[str], note: str = "") -> int:
+	try:
+		bits = cells_to_bits(cells or [])
+	except ValueError as e:
+		raise LogicError(str(e), 400)
+
+	with _locked(tutor_ids=(tutor_id,)):
+		schedules = db.setdefault("free_schedules", {})
+		if not isinstance(schedules.get(tutor_id), dict):
+			schedules[tutor_id] = {}
+		schedules[tutor_id][week] = {"bits": bits, "note": note}
+		_availability.set(tutor_id, week, bits)
+		mark_dirty("free_schedules", tutor_id)
+	return bits
+
+
+def get_free_schedule(tutor_id: str, week: str) -> Dict:
+	entry = db.get("free_schedules", {}).get(tutor_id, {})
+	entry = entry.get(week, {}) if isinstance(entry, dict) else {}
+	return {
+		"cells": bits_to_cells(_availability.get(tutor_id, week)),
+		"note": entry.get("note", "") if isinstance(entry, dict) else "",
+	}
+
+
+def who_is_free(week: str, day: Optional[int] = None, period: Optional[int] = None,
+                period_end: Optional[int] = None, cells: Optional[List[str]] = None) -> List[Dict]:
+	"""Tutors free in every requested cell (a day/period range or an explicit cell list)."""
+	if not cells and (day is None or period is None):
+		raise LogicError("Cần day và period, hoặc cells", 400)
+	try:
+		if cells:
+			mask = cells_to_bits(cells)
+		else:
+			try:
+				day, period = int(day), int(period)
+				period_end = int(period_end) if period_end is not None else None
+			except ValueError:
+				raise ValueError("day, period và period_end phải là số nguyên")
+			mask = range_mask(day, period, period_end)
+	except ValueError as e:
+		raise LogicError(str(e), 400)
+
+	users = db.get("users", {})
+	res = []
+	for tutor_id in _availability.who_is_free(week, mask):
+		user = users.get(tutor_id) or {}
+		res.append({"id": tutor_id, "name": user.get("name", "Unknown Tutor")})
+	return res
+
+
+def common_free_slots(week: str, tutor_ids: List[str]) -> List[str]:
+	if not tutor_ids:
+		raise LogicError("Cần ít nhất một tutor_id", 400)
+	return bits_to_cells(_availability.common_free(week, tutor_ids))
+
+
+# --- Phòng học (room occupancy) ---
+
+# Giờ mở cửa của một phòng trong tuần: 7 ngày x 15 giờ (6:00-21:00)
+ROOM_WEEKLY_OPEN_HOURS = float(os.environ.get("ROOM_WEEKLY_OPEN_HOURS", str(7 * 15)))
+
+
+def list_rooms() -> List[str]:
+	return sorted(_rooms)
+
+
+def free_rooms(start_str: str, end_str: str, rooms: Optional[List[str]] = None) -> List[str]:
+	"""Known rooms (or the given ones) with no session overlapping the window."""
+	start = epoch_seconds(_parse_time(start_str))
+	end = epoch_seconds(_parse_time(end_str))
+	if start >= end:
+		raise LogicError("Thời gian kết thúc phải sau thời gian bắt đầu", 400)
+	candidates = rooms if rooms else list_rooms()
+	return [place for place in candidates
+	        if room_key(place) and _room_index.find_conflict(room_key(place), start, end) is None]
+
+
+def week_bounds(week: str) -> tuple:
+	"""ISO week 'YYYY-Www' -> (monday 00:00, next monday 00:00) as epoch seconds."""
+	try:
+		year, num = week.upper().split("-W")
+		monday = datetime.fromisocalendar(int(year), int(num), 1)
+	except ValueError:
+		raise LogicError("week phải có dạng YYYY-Www (ví dụ 2025-W48)", 400)
+	start = epoch_seconds(monday)
+	return start, start + 7 * 86400
+
+
+def room_utilization(week: str) -> List[Dict]:
+	"""Booked hours per room in an ISO week, from the room index.
+
+	`utilization` is booked hours over ROOM_WEEKLY_OPEN_HOURS, both in hours.
+	"""
+	week_start, week_end = week_bounds(week)
+	res = []
+	for room in _room_index.keys():
+		booked = 0
+		sessions = 0
+		for s, e, _ in _room_index.overlapping(room, week_start, week_end):
+			booked += min(e, week_end) - max(s, week_start)
+			sessions += 1
+		if not sessions:
+			continue
+		hours = booked / 3600
+		res.append({
+			"room": room,
+			"sessions": sessions,
+			"booked_hours": round(hours, 2),
+			"utilization": round(hours / ROOM_WEEKLY_OPEN_HOURS, 4) if ROOM_WEEKLY_OPEN_HOURS else None,
+		})
+	res.sort(key=lambda r: r["utilization"] or 0, reverse=True)
+	return res
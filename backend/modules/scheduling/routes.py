@@ -1,5 +1,7 @@
+import time
+
 from flask import Blueprint, request, jsonify, g
-from core.security import require_role, require_login
+from core.security import require_role, require_login, _role_name
 from core.database import db
 from .logic import (
     create_appointment as logic_create_appointment,
@@ -9,6 +11,18 @@ from .logic import (
     cancel_student_appointment as logic_cancel_student_appointment,
     reschedule_appointment as logic_reschedule_appointment,
     save_minutes as logic_save_minutes,
+    bulk_enroll as logic_bulk_enroll,
+    save_free_schedule as logic_save_free_schedule,
+    get_free_schedule as logic_get_free_schedule,
+    who_is_free as logic_who_is_free,
+    common_free_slots as logic_common_free_slots,
+    list_rooms as logic_list_rooms,
+    free_rooms as logic_free_rooms,
+    room_utilization as logic_room_utilization,
+    create_series as logic_create_series,
+    get_series as logic_get_series,
+    cancel_series as logic_cancel_series,
+    reschedule_series as logic_reschedule_series,
     LogicError,
 )
 
@@ -33,7 +47,7 @@ def create_appointment():
 
     try:
         apt = logic_create_appointment(tutor_id, name, start_str, end_str, place, max_slot)
-        return jsonify({"message": "Tạo lịch thành công", "data": apt}), 201
+        return jsonify({"message": "Tạo lịch thành công", "data": apt.to_dict()}), 201
     except LogicError as e:
         return jsonify({"error": e.message}), e.status_code
     except Exception as e:
@@ -59,7 +73,7 @@ def cancel_appointment(apt_id):
 def book_appointment(apt_id):
     try:
         apt = logic_book_appointment(apt_id, g.user_id)
-        return jsonify({"message": "Đặt lịch thành công", "appointment": apt}), 200
+        return jsonify({"message": "Đặt lịch thành công", "appointment": apt.to_dict()}), 200
     except LogicError as e:
         return jsonify({"error": e.message}), e.status_code
     except Exception as e:
@@ -72,12 +86,133 @@ def cancel_student_appointment(apt_id):
     """Student cancels their booking for an appointment (DELETE /<apt_id>/book)."""
     try:
         apt = logic_cancel_student_appointment(apt_id, g.user_id)
-        return jsonify({"message": "Đã huỷ đặt lịch", "appointment": apt}), 200
+        return jsonify({"message": "Đã huỷ đặt lịch", "appointment": apt.to_dict()}), 200
+    except LogicError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# --- API CHUỖI LỊCH ĐỊNH KỲ (SERIES) ---
+
+def _error_response(e: LogicError):
+    body = {"error": e.message}
+    if e.details:
+        body.update(e.details)
+    return jsonify(body), e.status_code
+
+
+@bp.route("/series", methods=["POST"])
+@require_role("TUTOR")
+def create_series():
+    """
+    Tạo chuỗi buổi lặp lại, ví dụ hàng tuần trong 15 tuần:
+    { "name", "start_time", "end_time" (của buổi đầu tiên), "place", "max_slot",
+      "frequency": "WEEKLY"|"DAILY", "interval": 1, "count": 15,
+      "exceptions": ["2025-12-24"], "skip_conflicts": false }
+    """
+    data = request.get_json() or {}
+    name = data.get("name")
+    start_str = data.get("start_time")
+    end_str = data.get("end_time")
+    place = data.get("place")
+
+    if not all([name, start_str, end_str, place]):
+        return jsonify({"error": "Thiếu thông tin bắt buộc"}), 400
+
+    try:
+        result = logic_create_series(
+            g.user_id, name, start_str, end_str, place,
+            data.get("max_slot", 1),
+            frequency=data.get("frequency", "WEEKLY"),
+            interval=data.get("interval", 1),
+            count=data.get("count", 1),
+            exceptions=data.get("exceptions") or [],
+            skip_conflicts=bool(data.get("skip_conflicts", False)),
+        )
+        return jsonify({
+            "message": f"Tạo chuỗi {len(result['appointments'])} buổi thành công",
+            "series": result["series"],
+            "data": [apt.to_dict() for apt in result["appointments"]],
+            "skipped": result["skipped"],
+        }), 201
+    except LogicError as e:
+        return _error_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/series/<series_id>", methods=["GET"])
+def get_series(series_id):
+    try:
+        series = logic_get_series(series_id)
+    except LogicError as e:
+        return _error_response(e)
+    appts = db.get("appointments", {})
+    occurrences = [appts[i].to_dict() for i in series["appointment_ids"] if i in appts]
+    return jsonify({"series": series, "appointments": occurrences}), 200
+
+
+@bp.route("/series/<series_id>", methods=["PUT"])
+@require_role("TUTOR")
+def reschedule_series(series_id):
+    """Dời mọi buổi sắp tới của chuỗi: start_time/end_time là giờ mới của buổi sắp tới đầu tiên."""
+    data = request.get_json() or {}
+    start_str = data.get("start_time")
+    end_str = data.get("end_time")
+    if not all([start_str, end_str]):
+        return jsonify({"error": "Thiếu thông tin đổi lịch"}), 400
+
+    try:
+        moved = logic_reschedule_series(series_id, g.user_id, start_str, end_str, data.get("place"))
+        return jsonify({"message": f"Đã dời {len(moved)} buổi", "data": [a.to_dict() for a in moved]}), 200
+    except LogicError as e:
+        return _error_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/series/<series_id>", methods=["DELETE"])
+@require_role("TUTOR")
+def cancel_series(series_id):
+    """Huỷ mọi buổi sắp tới của chuỗi (muốn huỷ một buổi: DELETE /appointments/<apt_id>)."""
+    try:
+        cancelled = logic_cancel_series(series_id, g.user_id)
+        return jsonify({"message": f"Đã huỷ {len(cancelled)} buổi", "cancelled": [a.id for a in cancelled]}), 200
+    except LogicError as e:
+        return _error_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# --- API GHI DANH HÀNG LOẠT ---
+
+@bp.route("/bulk-enroll", methods=["POST"])
+@require_role(("TUTOR", "OFFICER", "DEPARTMENT", "ADMIN"))
+def bulk_enroll():
+    """
+    Ghi danh nhiều sinh viên vào nhiều buổi trong một request.
+    Body: { "enrollments": [ { "appointment_id": "...", "student_id": "..." }, ... ],
+            "all_or_nothing": false }
+    Mỗi cặp có kết quả riêng (ENROLLED / FAILED / SKIPPED). TUTOR chỉ được ghi danh vào buổi của mình.
+    """
+    data = request.get_json() or {}
+    started = time.perf_counter()
+    try:
+        result = logic_bulk_enroll(
+            data.get("enrollments"),
+            g.user_id,
+            _role_name(g.current_user.get("role")),
+            all_or_nothing=bool(data.get("all_or_nothing", False)),
+        )
     except LogicError as e:
         return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return jsonify(result), 200
+
 
 # --- API CHUNG (GET) ---
 @bp.route("/", methods=["GET"])
@@ -100,18 +235,12 @@ def save_free_schedule():
     cells = data.get('cells', [])
     week = str(data.get('week', '6'))
     note = data.get('note', '') # Nhận thêm ghi chú
-    
-    if 'free_schedules' not in db:
-        db['free_schedules'] = {}
-        
-    if tutor_id not in db['free_schedules'] or isinstance(db['free_schedules'][tutor_id], list):
-        db['free_schedules'][tutor_id] = {}
-        
-    # Lưu cả cells và note vào object theo tuần
-    db['free_schedules'][tutor_id][week] = {
-        "cells": cells,
-        "note": note
-    }
+
+    try:
+        # Lưu dạng bitset theo tuần (kèm ghi chú)
+        logic_save_free_schedule(tutor_id, week, cells, note)
+    except LogicError as e:
+        return jsonify({"error": e.message}), e.status_code
     
     return jsonify({"message": f"Đã lưu lịch và ghi chú tuần {week} thành công"}), 200
 
@@ -127,21 +256,79 @@ def get_free_schedule():
     if not target_id:
         return jsonify({"cells": [], "note": ""}), 200
 
-    user_data = db.get('free_schedules', {}).get(target_id, {})
-    
-    # Xử lý trường hợp dữ liệu cũ
-    if isinstance(user_data, list):
-        user_data = {} 
+    return jsonify(logic_get_free_schedule(target_id, week)), 200
 
-    week_data = user_data.get(week, {})
-    
-    if isinstance(week_data, list):
-        return jsonify({"cells": week_data, "note": ""}), 200
-        
-    return jsonify({
-        "cells": week_data.get('cells', []),
-        "note": week_data.get('note', '')
-    }), 200
+
+@bp.route('/free-schedule/who-is-free', methods=['GET'])
+@require_login
+def who_is_free():
+    """
+    Tutor rảnh tại một ô / khoảng tiết trong tuần.
+    Query: week, day (0 = Thứ 2), period, period_end (tuỳ chọn) hoặc cells=0-1,0-2
+    """
+    week = str(request.args.get('week', '6'))
+    cells = [c for c in request.args.get('cells', '').split(',') if c]
+    try:
+        tutors = logic_who_is_free(
+            week,
+            day=request.args.get('day'),
+            period=request.args.get('period'),
+            period_end=request.args.get('period_end'),
+            cells=cells,
+        )
+    except LogicError as e:
+        return jsonify({"error": e.message}), e.status_code
+    return jsonify({"week": week, "count": len(tutors), "tutors": tutors}), 200
+
+
+@bp.route('/free-schedule/common', methods=['GET'])
+@require_login
+def common_free_slots():
+    """Các ô mà mọi tutor trong tutor_ids (phân tách bằng dấu phẩy) đều rảnh."""
+    week = str(request.args.get('week', '6'))
+    tutor_ids = [t for t in request.args.get('tutor_ids', '').split(',') if t]
+    try:
+        cells = logic_common_free_slots(week, tutor_ids)
+    except LogicError as e:
+        return jsonify({"error": e.message}), e.status_code
+    return jsonify({"week": week, "tutor_ids": tutor_ids, "cells": cells}), 200
+
+
+# --- API PHÒNG HỌC ---
+@bp.route('/rooms', methods=['GET'])
+@require_login
+def list_rooms():
+    rooms = logic_list_rooms()
+    return jsonify({"count": len(rooms), "rooms": rooms}), 200
+
+
+@bp.route('/rooms/free', methods=['GET'])
+@require_login
+def free_rooms():
+    """Phòng trống trong khung giờ. Query: start_time, end_time, rooms (tuỳ chọn, phân tách bằng dấu phẩy)."""
+    start_str = request.args.get('start_time')
+    end_str = request.args.get('end_time')
+    if not all([start_str, end_str]):
+        return jsonify({"error": "Thiếu start_time hoặc end_time"}), 400
+
+    rooms = [r for r in request.args.get('rooms', '').split(',') if r.strip()]
+    try:
+        free = logic_free_rooms(start_str, end_str, rooms)
+    except LogicError as e:
+        return jsonify({"error": e.message}), e.status_code
+    return jsonify({"start_time": start_str, "end_time": end_str, "count": len(free), "rooms": free}), 200
+
+
+@bp.route('/rooms/utilization', methods=['GET'])
+@require_login
+def room_utilization():
+    """Số giờ sử dụng từng phòng trong một tuần ISO (week=2025-W48)."""
+    week = request.args.get('week', '')
+    try:
+        rooms = logic_room_utilization(week)
+    except LogicError as e:
+        return jsonify({"error": e.message}), e.status_code
+    return jsonify({"week": week, "rooms": rooms}), 200
 
 
 # --- API ĐỔI LỊCH (PUT) ---
@@ -171,7 +358,7 @@ def reschedule_appointment(apt_id):
             mode,
             max_slot
         )
-        return jsonify({"message": "Đổi lịch thành công", "data": updated_apt}), 200
+        return jsonify({"message": "Đổi lịch thành công", "data": updated_apt.to_dict()}), 200
     except LogicError as e:
         return jsonify({"error": e.message}), e.status_code
     except Exception as e:
@@ -0,0 +1,122 @@
+"""Concurrency benchmark for `scheduling.logic.book_appointment`.
+
+Many threads book random (student, appointment) pairs while seats are
+scarce, first with a single lock stripe (equivalent to the old global lock)
+and then with the configured striping. After each run every roster is
+checked against `max_slot` and against the number of successful bookings.
+
+By default the write-ahead log runs in a temporary directory with
+synchronous commit, as in a durable deployment: that is where holding one
+global lock across `mark_dirty` hurts, because no two bookings can share an
+fsync.
+
+    cd backend && python scripts/bench_booking.py --threads 16 --bookings 4000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import db, init_db  # noqa: E402
+from core.persistence import Persistence  # noqa: E402
+from core.models import AppointmentRecord, parse_epoch  # noqa: E402
+from modules.scheduling import logic  # noqa: E402
+
+
+def _seed(appointments: int, students: int, max_slot: int) -> None:
+    init_db("none")
+    base = parse_epoch("2030-01-01 08:00:00")
+    for i in range(students):
+        uid = f"s{i}"
+        db["users"][uid] = {"id": uid, "name": uid, "email": f"{uid}@bench", "role": "STUDENT",
+                            "booked_appointments": []}
+    for i in range(appointments):
+        # Non-overlapping sessions, so only capacity limits who gets a seat
+        start = base + i * 7200
+        db["appointments"][f"a{i}"] = AppointmentRecord(f"a{i}", f"t{i % 8}", f"Bench {i}",
+                                                         start, start + 3600, "H1", max_slot)
+    logic.rebuild_indexes()
+
+
+def run(stripes: int, args) -> dict:
+    logic.set_lock_stripes(stripes)
+    _seed(args.appointments, args.students, args.max_slot)
+
+    persistence = None
+    if not args.no_wal:
+        persistence = Persistence(tempfile.mkdtemp(prefix="bench-wal-"),
+                                  fsync_interval=args.fsync_ms / 1000.0, sync_commit=True)
+        persistence.start()
+
+    per_thread = args.bookings // args.threads
+    booked = [0] * args.threads
+    rejected = [0] * args.threads
+    barrier = threading.Barrier(args.threads + 1)
+
+    def worker(n):
+        rnd = random.Random(n)
+        barrier.wait()
+        for _ in range(per_thread):
+            apt_id = f"a{rnd.randrange(args.appointments)}"
+            student_id = f"s{rnd.randrange(args.students)}"
+            try:
+                logic.book_appointment(apt_id, student_id)
+                booked[n] += 1
+            except logic.LogicError:
+                rejected[n] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    if persistence is not None:
+        persistence.close()
+
+    overbooked = sum(1 for apt in db["appointments"].values() if len(apt.roster) > apt.max_slot)
+    seats = sum(len(apt.roster) for apt in db["appointments"].values())
+    return {
+        "stripes": stripes,
+        "attempts": per_thread * args.threads,
+        "booked": sum(booked),
+        "rejected": sum(rejected),
+        "seconds": round(elapsed, 3),
+        "ops_per_sec": round(per_thread * args.threads / elapsed, 1),
+        "overbooked_appointments": overbooked,
+        "roster_matches_bookings": seats == sum(booked),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--bookings", type=int, default=4000, help="total booking attempts")
+    parser.add_argument("--appointments", type=int, default=200)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--max-slot", type=int, default=5)
+    parser.add_argument("--stripes", type=int, default=64)
+    parser.add_argument("--fsync-ms", type=float, default=2.0)
+    parser.add_argument("--no-wal", action="store_true", help="benchmark pure in-memory booking")
+    args = parser.parse_args()
+
+    results = [run(1, args), run(args.stripes, args)]
+    for r in results:
+        print(f"stripes={r['stripes']:>3}  {r['ops_per_sec']:>9} ops/s  "
+              f"booked={r['booked']} rejected={r['rejected']} in {r['seconds']}s  "
+              f"overbooked={r['overbooked_appointments']} consistent={r['roster_matches_bookings']}")
+    print(f"speedup x{results[1]['ops_per_sec'] / results[0]['ops_per_sec']:.2f}")
+    if any(r["overbooked_appointments"] or not r["roster_matches_bookings"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
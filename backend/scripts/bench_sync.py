@@ -0,0 +1,78 @@
+"""Benchmark for the scheduled personal-data sync (`DataSyncService`).
+
+A mock DataCore with `--users` profiles is synced into a database that
+already holds those users, as in a nightly run (or, with `--import`, into an
+empty one, so the first run creates every account). The first run has no
+content hashes yet and rewrites every user; the second finds everything
+unchanged; the third runs after `--change-pct` percent of the profiles were
+edited upstream.
+
+    cd backend && python scripts/bench_sync.py --users 100000
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import db, init_db  # noqa: E402
+from modules.integration.services import DataSyncService, MockDataCoreClient  # noqa: E402
+
+
+class GeneratedDataCore(MockDataCoreClient):
+    def __init__(self, users: int):
+        self.DATACORE_DB = {
+            f"d{i}": {"name": f"Sinh viên {i}", "email": f"d{i}@hcmut.edu.vn", "role": "STUDENT",
+                      "major": "Khoa học Máy tính", "faculty": "KH&KT Máy tính",
+                      "phone": f"09{i:08d}", "address": "TP.HCM"}
+            for i in range(users)
+        }
+
+
+def _seed(datacore: GeneratedDataCore, existing: bool) -> None:
+    init_db("none")
+    if existing:
+        for uid, profile in datacore.DATACORE_DB.items():
+            db["users"][uid] = {"id": uid, **profile, "password": None, "booked_appointments": []}
+    db.pop("sync_hashes", None)
+    from core.database import rebuild_indexes
+    rebuild_indexes()
+
+
+def _timed_run(service: DataSyncService, label: str) -> None:
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = service.run_scheduled_personal_data_sync()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {elapsed:8.3f}s  {report.records_processed / elapsed:>10.0f} rec/s  "
+          f"created={report.created} updated={report.updated} unchanged={report.unchanged} "
+          f"errors={len(report.errors)} status={report.status.value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--change-pct", type=float, default=1.0)
+    parser.add_argument("--import", dest="initial_import", action="store_true",
+                        help="start from an empty database (initial import)")
+    args = parser.parse_args()
+
+    datacore = GeneratedDataCore(args.users)
+    _seed(datacore, existing=not args.initial_import)
+    service = DataSyncService()
+    service.datacore_client = datacore
+
+    _timed_run(service, "first")
+    _timed_run(service, "unchanged")
+
+    ids = list(datacore.DATACORE_DB)
+    for uid in random.Random(0).sample(ids, int(len(ids) * args.change_pct / 100)):
+        datacore.DATACORE_DB[uid]["phone"] = "0900000000"
+    _timed_run(service, "changed")
+
+
+if __name__ == "__main__":
+    main()